@@ -5,52 +5,114 @@ This application collects patient feedback, stores it in MongoDB and Redis,
 and generates various charts (bar graphs and pie charts) for analysis.
 """
 
+import functools
 import json
 import os
-import re
+from contextlib import asynccontextmanager
+from email.utils import formatdate
 
-import matplotlib
-import matplotlib.pyplot as plt
-import numpy as np
 from fastapi import FastAPI, HTTPException, Request, status
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from pymongo.errors import DuplicateKeyError
+from starlette.concurrency import run_in_threadpool
 from starlette.middleware.sessions import SessionMiddleware
 
-from db_clients import create_mongo_db_client, create_redis_client
-
-# Configure matplotlib to use a backend suitable for environments without a display server.
-matplotlib.use("agg")
+import svg_charts
+from bulk_ingest import aiter_lines, ingest_lines_async
+from chart_cache import ChartCache
+from chart_executor import ChartExecutor
+from dashboard_prerender import (
+    PRERENDER_MODE,
+    bargraph_grid_spec,
+    bargraph_specs,
+    load_dashboard_stats_async,
+    piechart_grid_spec,
+    piechart_specs,
+    ranking_grid_spec,
+    ranking_specs,
+    read_dashboard_version_async,
+    start_prerender_thread,
+)
+from db_clients import (
+    create_async_mongo_db_client,
+    create_async_redis_client,
+    ensure_feedback_indexes_async,
+    get_feedback_collection,
+    get_redis_client,
+    ping_async_mongo_db_client,
+    ping_async_redis_client,
+    redis_connection_settings,
+)
+from feedback_records import build_feedback_filter, build_feedback_record, to_document
+from feedback_search import (
+    DETAIL_COLUMNS,
+    MANAGE_LIST_COLUMNS,
+    SEARCH_FIELDS,
+    SearchPage,
+    buffer_chunks_async,
+    find_details_async,
+    search_keys,
+    search_page_async,
+    search_rows_async,
+    wants_all_rows,
+)
+from feedback_stats import (
+    RATING_COLS,
+    adjust_counters,
+    begin_write_async,
+    bump_data_version,
+    end_write,
+    update_counters,
+)
+from write_behind import WRITE_BEHIND_ENABLED, enqueue_feedback
 
 
 # ----------------------------
 # Database Client Initialization
 # ----------------------------
-def set_db_clients() -> tuple:
+@asynccontextmanager
+async def lifespan(app: FastAPI):
     """
-    Initialize and return MongoDB and Redis clients.
+    Create the asyncio MongoDB and Redis clients on startup and close them on shutdown.
+    Routes reach them through `request.app.state.collection` and `request.app.state.redis_client`.
     """
     username = os.getenv("USER_NAME")
     password = os.getenv("PASSWORD_MONGODB")
-    MongoDB_Client = create_mongo_db_client(username, password)
+    MongoDB_Client = create_async_mongo_db_client(username, password)
+    await ping_async_mongo_db_client(MongoDB_Client)
+
+    # Host, port and password (REDIS_HOST, REDIS_PORT, REDIS_PASSWORD) are read the same way as for the
+    # synchronous clients; pool size and timeouts come from db_clients.redis_pool_options().
+    redis_client = create_async_redis_client(**redis_connection_settings())
+    await ping_async_redis_client(redis_client)
+
+    app.state.collection = MongoDB_Client["Naseeb"]["Feedback"]
+    await ensure_feedback_indexes_async(app.state.collection)
+    app.state.redis_client = redis_client
 
-    redis_host = os.getenv("REDIS_HOST", "localhost")
-    redis_port = int(os.getenv("REDIS_PORT"))
-    redis_password = None  # Update if a Redis password is required
-    redis_client = create_redis_client(redis_host=redis_host, redis_port=redis_port, redis_password=redis_password)
+    # Rebuild the dashboard charts in the background (DASHBOARD_PRERENDER=thread). The scheduler runs
+    # in its own thread, so it uses the synchronous clients.
+    prerender_stop = None
+    if PRERENDER_MODE == "thread":
 
-    return MongoDB_Client, redis_client
+        def get_clients():
+            return get_feedback_collection(), get_redis_client()
 
+        _, prerender_stop = start_prerender_thread(get_clients, chart_cache, chart_executor.render_many)
+    yield
+    if prerender_stop is not None:
+        prerender_stop.set()
+    MongoDB_Client.close()
+    await redis_client.aclose(close_connection_pool=True)
+    chart_executor.shutdown()
 
-MONGODB_CLIENT, redis_client = set_db_clients()
-db = MONGODB_CLIENT["Naseeb"]
-collection = db["Feedback"]
 
 # ----------------------------
 # FastAPI Application Setup
 # ----------------------------
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Mount the static files and give it the name "static"
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -60,6 +122,110 @@ app.add_middleware(SessionMiddleware, secret_key=os.urandom(24).hex())
 # Mount the "static" directory to serve images and other static files.
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
+# The same templates rendered with `generate_async`, so a template can iterate a Motor cursor.
+stream_templates = templates.env.overlay(enable_async=True)
+
+# In-memory cache of rendered chart images, reused while the underlying counts are unchanged.
+# CHART_CACHE_BACKEND=redis shares them between worker processes through Redis; the cache runs in
+# worker threads, so it uses the synchronous Redis client.
+chart_cache = ChartCache(
+    max_entries=int(os.getenv("CHART_CACHE_SIZE", 256)),
+    get_redis=get_redis_client if os.getenv("CHART_CACHE_BACKEND", "memory").lower() == "redis" else None,
+    ttl=int(os.getenv("CHART_CACHE_TTL", 3600)),
+)
+
+# Worker processes that draw the charts of a page in parallel (started on the first cache miss).
+chart_executor = ChartExecutor(max_workers=int(os.getenv("CHART_RENDER_WORKERS", 0)) or None)
+
+
+# Chart images are named after a hash of their data, so a URL always serves the same bytes.
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Check whether the request's If-None-Match header lists `etag` (weak comparison)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in tags or etag in tags
+
+
+def conditional_on_data_version(endpoint):
+    """
+    Let a chart endpoint answer `If-None-Match` with 304 Not Modified while the feedback data is
+    unchanged, before any counts are loaded or charts drawn. Other responses carry the data
+    version as their ETag and the time of the last write as Last-Modified.
+    """
+
+    @functools.wraps(endpoint)
+    async def wrapper(request: Request, *args, **kwargs):
+        version, modified = await read_dashboard_version_async(request.app.state.redis_client, stats_filter(request))
+        # The renderer changes the page markup, so it is part of the tag.
+        renderer = "svg" if svg_charts.SVG_ENABLED else "png"
+        etag = f'"{version}-{modified}-{renderer}"'
+        headers = {
+            "ETag": etag,
+            "Last-Modified": formatdate(modified, usegmt=True),
+            "Cache-Control": "no-cache",  # Always revalidate, which is cheap.
+        }
+        if etag_matches(request, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        response = await endpoint(request, *args, **kwargs)
+        response.headers.update(headers)
+        return response
+
+    return wrapper
+
+
+def dashboard_requested(request: Request) -> bool:
+    """
+    Check whether the page should draw its charts in the browser (`?mode=dashboard`).
+    The page then only loads /api/stats, so the server renders no images for it.
+    """
+    return request.query_params.get("mode") == "dashboard"
+
+
+def grid_requested(request: Request) -> bool:
+    """
+    Check whether the page should show its charts as one composite image (`?mode=grid`),
+    which is encoded once and fetched in a single request.
+    """
+    return request.query_params.get("mode") == "grid"
+
+
+def stats_filter(request: Request) -> dict:
+    """
+    Build the MongoDB filter for the optional `from` / `to` (YYYY-MM-DD) and `department` query
+    parameters, so the charts count only the matching feedback. Raises 400 on an invalid date.
+    """
+    try:
+        return build_feedback_filter(request.query_params)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+async def render_grid_chart(spec) -> str:
+    """Render a page's composite chart (or reuse it from the chart cache) and return its URL."""
+    [name] = await run_in_threadpool(chart_cache.get_or_render_many, [spec], chart_executor.render_many)
+    return app.url_path_for("chart_image", name=name)
+
+
+async def render_charts(specs) -> list:
+    """
+    Draw a page's charts as inline SVG, falling back to matplotlib PNGs for charts the SVG renderer
+    cannot draw or when CHART_RENDERER=matplotlib. PNGs are rendered on the process pool and cached;
+    waiting on the pool happens in a worker thread so the event loop keeps serving requests.
+    Returns, per spec, either the SVG markup or the URL the PNG is served from.
+    """
+    charts = svg_charts.render_many(specs)
+    fallback = [i for i, chart in enumerate(charts) if chart is None]
+    if fallback:
+        fallback_specs = [specs[i] for i in fallback]
+        names = await run_in_threadpool(chart_cache.get_or_render_many, fallback_specs, chart_executor.render_many)
+        for i, name in zip(fallback, names):
+            charts[i] = app.url_path_for("chart_image", name=name)
+    return charts
 
 
 # ----------------------------
@@ -80,54 +246,79 @@ async def post_feedback(request: Request):
     """
     form = await request.form()
     try:
-        patient_id = int(form.get("patient_id"))
-    except (TypeError, ValueError):
-        raise HTTPException(status_code=400, detail="Invalid patient ID.")
+        feedback_data = build_feedback_record(form)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid form data: {e}")
+    patient_id = feedback_data["patient_id"]
 
-    # Check session and MongoDB for duplicate submissions.
-    if request.session.get("patient_id") or collection.find_one({"patient_id": patient_id}):
+    collection = request.app.state.collection
+    redis_client = request.app.state.redis_client
+
+    # Check the session for duplicate submissions.
+    if request.session.get("patient_id"):
+        return RedirectResponse(url="/feedback_error", status_code=status.HTTP_303_SEE_OTHER)
+
+    if WRITE_BEHIND_ENABLED:
+        # Claim the data key (it doubles as the duplicate check) and queue the record for the
+        # write-behind worker, so the patient never waits on MongoDB.
+        if not await redis_client.set(f"data:{patient_id}", json.dumps(feedback_data), nx=True):
+            return RedirectResponse(url="/feedback_error", status_code=status.HTTP_303_SEE_OTHER)
+        request.session["patient_id"] = patient_id
+        await enqueue_feedback(redis_client, feedback_data)
+        return RedirectResponse(url="/feedback_thankyou", status_code=status.HTTP_303_SEE_OTHER)
+
+    # Insert data into MongoDB (a copy, so the generated _id stays out of the Redis JSON).
+    # The unique index on patient_id rejects duplicate submissions.
+    write_token = await begin_write_async(redis_client)
+    try:
+        await collection.insert_one(to_document(feedback_data))
+    except DuplicateKeyError:
+        await end_write(redis_client, write_token)
         return RedirectResponse(url="/feedback_error", status_code=status.HTTP_303_SEE_OTHER)
 
     # Mark submission in session.
     request.session["patient_id"] = patient_id
 
-    # Retrieve additional feedback details.
-    try:
-        feedback_data = {
-            "patient_id": patient_id,
-            "name": form.get("name"),
-            "age": int(form.get("age")),
-            "email": form.get("email"),
-            "date": form.get("date"),
-            "overall_exp": int(form.get("overall_exp")),
-            "doc_care": int(form.get("doc_care")),
-            "doc_comm": int(form.get("doc_comm")),
-            "nurse_care": int(form.get("nurse_care")),
-            "food_quality": int(form.get("food_quality")),
-            "accommodation": int(form.get("accommodation")),
-            "sanitization": int(form.get("sanitization")),
-            "safety": int(form.get("safety")),
-            "staff_support": int(form.get("staff_support")),
-            "doc_involvement": form.get("doc_involvement"),
-            "nurse_promptness": form.get("nurse_promptness"),
-            "cleanliness": form.get("cleanliness"),
-            "timely_info": form.get("timely_info"),
-            "med_info": form.get("med_info"),
-            "other_comments": form.get("other_comments"),
-        }
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Invalid form data: {e}")
-
-    # Save data in Redis as a JSON string.
+    # Save data in Redis as a JSON string and update the chart counters in one pipeline.
     data_json = json.dumps(feedback_data)
-    redis_client.set(f"data:{feedback_data['patient_id']}", data_json)
-
-    # Insert data into MongoDB.
-    collection.insert_one(feedback_data)
+    pipe = redis_client.pipeline()
+    pipe.set(f"data:{feedback_data['patient_id']}", data_json)
+    update_counters(pipe, feedback_data)
+    bump_data_version(pipe)
+    end_write(pipe, write_token)
+    await pipe.execute()
 
     return RedirectResponse(url="/feedback_thankyou", status_code=status.HTTP_303_SEE_OTHER)
 
 
+class RequestBodyStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse for a body iterator that is still reading the request body.
+
+    StreamingResponse listens for client disconnects on the request's receive channel while it
+    streams, which would swallow the body chunks the iterator has not read yet. This one only
+    streams; a disconnect while the body is read still ends the request (ClientDisconnect).
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+@app.post("/feedback/bulk")
+async def post_feedback_bulk(request: Request):
+    """
+    Ingest many feedback records from an NDJSON (default) or CSV (Content-Type: text/csv) body.
+    The body is read and written in batches while one JSON result line per record is streamed back.
+    """
+    fmt = "csv" if request.headers.get("content-type", "").startswith("text/csv") else "ndjson"
+    lines = aiter_lines(request.stream())
+    results = ingest_lines_async(request.app.state.collection, request.app.state.redis_client, lines, fmt)
+    result_lines = (json.dumps(result) + "\n" async for result in results)
+    return RequestBodyStreamingResponse(result_lines, media_type="application/x-ndjson")
+
+
 @app.get("/feedback_thankyou", response_class=HTMLResponse, name="feedback_thankyou")
 async def feedback_thankyou(request: Request):
     """Render the thank-you page after successful submission."""
@@ -252,107 +443,38 @@ async def home(request: Request):
 
 
 @app.get("/bargraphs", response_class=HTMLResponse, name="bargraphs")
+@conditional_on_data_version
 async def bargraphs(request: Request):
     """
     Generate bar graphs for rating and yes/no responses and display them.
     """
-    rating_cols = [
-        "overall_exp",
-        "doc_care",
-        "doc_comm",
-        "nurse_care",
-        "food_quality",
-        "accommodation",
-        "sanitization",
-        "safety",
-        "staff_support",
-    ]
-    bargraph_paths = []
-
-    def bar_graph_rating(col_name):
-        ratings = collection.find({}, {"_id": 0, col_name: 1})
-        counts = {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
-
-        for rating in ratings:
-            star = rating.get(col_name)
-            if star in counts:
-                counts[star] += 1
-
-        x_labels = ["1 Star", "2 Star", "3 Star", "4 Star", "5 Star"]
-        y_values = [counts[1], counts[2], counts[3], counts[4], counts[5]]
-
-        plt.figure()
-        plt.bar(x_labels, y_values)
-        for i, count in enumerate(y_values):
-            plt.text(i, count, str(count), ha="center", va="bottom")
-        plt.title(col_name)
-        plt.xlabel("Rating")
-        plt.ylabel("Number of Patients")
-
-        # Ensure the "static" folder exists
-        if not os.path.exists("static"):
-            os.makedirs("static")
-
-        # Save the graph image in the static directory
-        image_path = f"static/bar_graph_{col_name}.png"
-        plt.savefig(image_path)
-        plt.close()
-
-        return sum(y_values), image_path
-
-    total_ratings = 0
-    # Generate bar graphs for each rating column.
-    for col in rating_cols:
-        count, path = bar_graph_rating(col)
-        total_ratings += count
-        bargraph_paths.append(path)
-
-    # Generate a stacked bar graph for yes/no responses.
-    yes_no_paths = []
-
-    def bar_graph_yes_no():
-        yes_no_cols = ["doc_involvement", "nurse_promptness", "cleanliness", "timely_info", "med_info"]
-        counts_yes = [0] * len(yes_no_cols)
-        counts_no = [0] * len(yes_no_cols)
-
-        for doc in collection.find():
-            for i, col in enumerate(yes_no_cols):
-                if doc.get(col) == "yes":
-                    counts_yes[i] += 1
-                elif doc.get(col) == "no":
-                    counts_no[i] += 1
-
-        plt.figure()
-        x_indices = range(len(yes_no_cols))
-        plt.bar(x_indices, counts_yes, label="Yes")
-        plt.bar(x_indices, counts_no, bottom=counts_yes, label="No")
-        for i, count in enumerate(counts_yes):
-            plt.text(i, count, str(count), ha="center", va="bottom")
-        for i, count in enumerate(counts_no):
-            plt.text(i, count + counts_yes[i], str(count), ha="center", va="bottom")
-        plt.title("Responses to Yes/No Questions")
-        plt.xlabel("Question")
-        plt.ylabel("Count")
-        plt.xticks(x_indices, yes_no_cols)
-        plt.legend()
-        plt.gcf().set_size_inches(15, 8)
-
-        if not os.path.exists("static"):
-            os.makedirs("static")
-        image_path = "static/bar_graph_yes_no.png"
-        plt.savefig(image_path, dpi=100, bbox_inches="tight")
-        plt.close()
-        yes_no_paths.append(image_path)
-
-    bar_graph_yes_no()
+    if dashboard_requested(request):
+        context = {"request": request, "title": "Bar Graph Analysis", "dashboard": "bargraphs"}
+        return templates.TemplateResponse("bargraph_get.html", context)
+
+    # Read every rating and yes/no count from the Redis counters (or the pre-rendered snapshot),
+    # or count the filtered feedback in MongoDB.
+    stats = await load_dashboard_stats_async(
+        request.app.state.collection, request.app.state.redis_client, stats_filter(request)
+    )
+
+    # Describe a bar graph for each rating column and a stacked bar graph for yes/no responses.
+    specs = bargraph_specs(stats)
+    total_ratings = sum(stats.rating_total(col) for col in RATING_COLS)
 
     title = f"Bar Graph Analysis (Total Ratings = {total_ratings})"
-    # Pass the first few image paths for demonstration.
+    if grid_requested(request):
+        # One composite image of every rating bar graph and the yes/no panel.
+        context = {"request": request, "title": title, "grid": await render_grid_chart(bargraph_grid_spec(specs))}
+        return templates.TemplateResponse("bargraph_get.html", context)
+
+    # Draw the charts as inline SVG (or render PNGs when falling back to matplotlib).
+    *bargraph_charts, yes_no_chart = await render_charts(specs)
     context = {
         "request": request,
         "title": title,
-        "bargraphs": bargraph_paths,
-        "yes_no": yes_no_paths[0] if yes_no_paths else "",
+        "bargraphs": bargraph_charts,
+        "yes_no": yes_no_chart,
     }
     return templates.TemplateResponse("bargraph_get.html", context)
 
@@ -451,215 +573,111 @@ async def bargraphs(request: Request):
 
 
 @app.get("/piecharts", response_class=HTMLResponse, name="piecharts")
+@conditional_on_data_version
 async def piecharts(request: Request):
     """
     Generate pie charts for rating and yes/no responses and display them.
     """
-    rating_cols = [
-        "overall_exp",
-        "doc_care",
-        "doc_comm",
-        "nurse_care",
-        "food_quality",
-        "accommodation",
-        "sanitization",
-        "safety",
-        "staff_support",
-    ]
-    piechart_paths = []
-
-    def piechart_rating(col_name):
-        one_star = collection.count_documents({col_name: 1})
-        two_star = collection.count_documents({col_name: 2})
-        three_star = collection.count_documents({col_name: 3})
-        four_star = collection.count_documents({col_name: 4})
-        five_star = collection.count_documents({col_name: 5})
-        total = one_star + two_star + three_star + four_star + five_star
-
-        labels = ["1 Star", "2 Star", "3 Star", "4 Star", "5 Star"]
-        sizes = [one_star, two_star, three_star, four_star, five_star]
-        plt.figure()
-        patches, _ = plt.pie(sizes, startangle=90)
-        plt.axis("equal")
-        plt.title(f"{col_name} Rating")
-        percentages = [f"{size} ({size / total * 100:.1f}%)" if total > 0 else "0" for size in sizes]
-        legend_labels = [f"{label}\n{perc}" for label, perc in zip(labels, percentages)]
-        plt.legend(patches, legend_labels, title="Star Ratings")
-
-        # Ensure the "static" folder exists
-        if not os.path.exists("static"):
-            os.makedirs("static")
-
-        # Save the pie chart image in the static folder
-        image_path = f"static/piechart_{col_name}.png"
-        plt.savefig(image_path)
-        plt.close()
-
-        # Append relative path (for use in the template)
-        piechart_paths.append(image_path.split("static/")[-1])  # Save relative path
-        return total
-
-    yes_no_paths = []
-
-    def piechart_yes_no():
-        def count_yes_no(question):
-            yes_count = collection.count_documents({question: "yes"})
-            no_count = collection.count_documents({question: "no"})
-            return yes_count, no_count
-
-        def plot_pie(question):
-            yes_count, no_count = count_yes_no(question)
-            total_count = yes_count + no_count if (yes_count + no_count) > 0 else 1
-            labels = ["Yes", "No"]
-            values = [yes_count, no_count]
-            percentages = [f"{count} ({count / total_count * 100:.1f}%)" for count in values]
-            plt.figure()
-            patches, _ = plt.pie(values, startangle=90)
-            plt.axis("equal")
-            plt.title(question)
-            legend_labels = [f"{label}\n{perc}" for label, perc in zip(labels, percentages)]
-            plt.legend(patches, legend_labels)
-
-            # Ensure the "static" folder exists
-            if not os.path.exists("static"):
-                os.makedirs("static")
-
-            image_path = f"static/piechart_yes_no_{question}.png"
-            plt.savefig(image_path)
-            plt.close()
-
-            # Append relative path (for use in the template)
-            yes_no_paths.append(image_path.split("static/")[-1])  # Save relative path
-
-        questions = ["doc_involvement", "nurse_promptness", "cleanliness", "timely_info", "med_info"]
-        for question in questions:
-            plot_pie(question)
-
-    total_ratings = 0
-    count_val = 0
-    for col in rating_cols:
-        total_ratings += piechart_rating(col)
-        count_val += 1
-    piechart_yes_no()
-    average_ratings = total_ratings // count_val if count_val else 0
+    if dashboard_requested(request):
+        context = {"request": request, "title": "Pie Chart Analysis", "dashboard": "piecharts"}
+        return templates.TemplateResponse("piechart_get.html", context)
+
+    # Read every rating and yes/no count from the Redis counters (or the pre-rendered snapshot),
+    # or count the filtered feedback in MongoDB.
+    stats = await load_dashboard_stats_async(
+        request.app.state.collection, request.app.state.redis_client, stats_filter(request)
+    )
+
+    # Describe a pie chart for each rating column and each yes/no question.
+    specs = piechart_specs(stats)
+    total_ratings = sum(stats.rating_total(col) for col in RATING_COLS)
+    average_ratings = total_ratings // len(RATING_COLS)
 
     title = f"Pie Chart Analysis (Average Total Ratings = {average_ratings})"
+    if grid_requested(request):
+        # One composite image of every rating pie and yes/no pie.
+        context = {"request": request, "title": title, "grid": await render_grid_chart(piechart_grid_spec(specs))}
+        return templates.TemplateResponse("piechart_get.html", context)
+
+    # Draw the charts as inline SVG (or render PNGs when falling back to matplotlib).
+    page_charts = await render_charts(specs)
+    piechart_charts, yes_no_charts = page_charts[: len(RATING_COLS)], page_charts[len(RATING_COLS) :]
     context = {
         "request": request,
         "title": title,
-        "piecharts": piechart_paths,
-        "yes_no": yes_no_paths,
+        "piecharts": piechart_charts,
+        "yes_no": yes_no_charts,
     }
     return templates.TemplateResponse("piechart_get.html", context)
 
 
 @app.get("/overall_bargraphs", response_class=HTMLResponse, name="overall_bargraphs")
+@conditional_on_data_version
 async def overall_bargraphs(request: Request):
     """
     Generate overall bar graphs combining star ratings and yes/no responses.
     """
-
-    def save_bar_graphs_():
-        star_ratings = [1, 2, 3, 4, 5]
-        rating_cols = [
-            "overall_exp",
-            "doc_care",
-            "doc_comm",
-            "nurse_care",
-            "food_quality",
-            "accommodation",
-            "sanitization",
-            "safety",
-            "staff_support",
-        ]
-        yes_no_cols = ["doc_involvement", "nurse_promptness", "cleanliness", "timely_info", "med_info"]
-
-        ratings_counts = [[] for _ in range(len(star_ratings))]
-        yes_no_counts = [[], []]
-        x_labels = []
-
-        for col in rating_cols:
-            for i, star in enumerate(star_ratings):
-                count = collection.count_documents({col: star})
-                ratings_counts[i].append(count)
-            x_labels.append(col)
-
-        for col in yes_no_cols:
-            yes_count = collection.count_documents({col: "yes"})
-            no_count = collection.count_documents({col: "no"})
-            yes_no_counts[0].append(yes_count)
-            yes_no_counts[1].append(no_count)
-            x_labels.append(f"{col} (Yes/No)")
-
-        sorted_counts = []
-        sorted_labels = []
-        for i in range(len(star_ratings)):
-            indices = np.argsort(ratings_counts[i])[::-1]
-            sorted_counts.append([ratings_counts[i][j] for j in indices])
-            sorted_labels.append([x_labels[j] for j in indices])
-
-        yes_indices = np.argsort(yes_no_counts[0])[::-1]
-        no_indices = np.argsort(yes_no_counts[1])[::-1]
-        sorted_counts.append([yes_no_counts[0][j] for j in yes_indices])
-        sorted_counts.append([yes_no_counts[1][j] for j in no_indices])
-        sorted_labels.append([x_labels[j] for j in yes_indices])
-        sorted_labels.append([x_labels[j] for j in no_indices])
-
-        image_paths = []
-        # Create bar graphs for star ratings.
-        for i, star in enumerate(star_ratings):
-            plt.figure(figsize=(10, 6))
-            bars = plt.bar(range(len(sorted_counts[i])), sorted_counts[i])
-            plt.xlabel("Column")
-            plt.ylabel("Count")
-            plt.title(f"Count of {star}-Star Ratings by Column")
-            plt.xticks(range(len(sorted_counts[i])), sorted_labels[i], rotation="vertical")
-            plt.tight_layout()
-            for bar in bars:
-                plt.text(
-                    bar.get_x() + bar.get_width() / 2, bar.get_height(), int(bar.get_height()), ha="center", va="bottom"
-                )
-            if not os.path.exists("static"):
-                os.makedirs("static")
-            image_path = f"static/bargraph_{star}_star_ratings.png"
-            plt.savefig(image_path)
-            plt.close()
-            image_paths.append(image_path.split("static/")[-1])  # Save relative path
-
-        # Create bar graphs for yes/no responses.
-        for i in range(2):
-            plt.figure(figsize=(10, 6))
-            bars = plt.bar(range(len(sorted_counts[i + len(star_ratings)])), sorted_counts[i + len(star_ratings)])
-            plt.xlabel("Column")
-            plt.ylabel("Count")
-            plt.title("Count of Yes/No Responses by Column")
-            plt.xticks(
-                range(len(sorted_counts[i + len(star_ratings)])),
-                sorted_labels[i + len(star_ratings)],
-                rotation="vertical",
-            )
-            plt.tight_layout()
-            for bar in bars:
-                plt.text(
-                    bar.get_x() + bar.get_width() / 2, bar.get_height(), int(bar.get_height()), ha="center", va="bottom"
-                )
-            path_img = "static/bargraph_yes_responses.png" if i == 0 else "static/bargraph_no_responses.png"
-            plt.savefig(path_img)
-            plt.close()
-            image_paths.append(path_img.split("static/")[-1])  # Save relative path
-
-        return image_paths
-
     title = "Overall Bar Graph Analysis"
-    image_paths = save_bar_graphs_()
+    if dashboard_requested(request):
+        context = {"request": request, "title": title, "dashboard": "overall_bargraphs"}
+        return templates.TemplateResponse("overall_bargraph_get.html", context)
+
+    # Read every rating and yes/no count from the Redis counters (or the pre-rendered snapshot),
+    # or count the filtered feedback in MongoDB.
+    stats = await load_dashboard_stats_async(
+        request.app.state.collection, request.app.state.redis_client, stats_filter(request)
+    )
+
+    # Create bar graphs ranking the columns for each star rating, then for yes and no responses.
+    specs = ranking_specs(stats)
+    if grid_requested(request):
+        # One composite image of every ranking.
+        context = {"request": request, "title": title, "grid": await render_grid_chart(ranking_grid_spec(specs))}
+        return templates.TemplateResponse("overall_bargraph_get.html", context)
+
     context = {
         "request": request,
         "title": title,
-        "bargraphs": image_paths,
+        "bargraphs": await render_charts(specs),
     }
     return templates.TemplateResponse("overall_bargraph_get.html", context)
 
 
+@app.get("/api/stats", name="api_stats")
+@conditional_on_data_version
+async def api_stats(request: Request):
+    """
+    Return every star-rating distribution, yes/no count and column ranking as JSON,
+    for dashboards that draw the charts in the browser. Accepts the same filters as the chart pages.
+    """
+    stats = await load_dashboard_stats_async(
+        request.app.state.collection, request.app.state.redis_client, stats_filter(request)
+    )
+    return JSONResponse(stats.to_payload())
+
+
+@app.get("/charts/{name}", name="chart_image")
+async def chart_image(request: Request, name: str):
+    """
+    Serve a rendered chart image from the chart cache, with long-lived caching headers.
+    Returns 404 if the chart is not cached (e.g. it has been evicted).
+    """
+    headers = {"ETag": f'"{name}"', "Cache-Control": IMMUTABLE_CACHE_CONTROL}
+    if etag_matches(request, headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    # A local miss may read from Redis, so look it up in a worker thread.
+    image = await run_in_threadpool(chart_cache.get, name)
+    if image is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chart not found")
+    return Response(content=image, media_type="image/png", headers=headers)
+
+
+@app.get("/chart_cache_stats", name="chart_cache_stats")
+async def chart_cache_stats():
+    """Report hit and miss counts for the chart image cache."""
+    return chart_cache.stats()
+
+
 # ----------------------------
 # Routes for Data Management
 # ----------------------------
@@ -674,15 +692,36 @@ async def manage_get(request: Request):
 @app.post("/manage")
 async def manage_post(request: Request):
     """
-    Process management form submissions for showing, updating, or deleting entries.
+    Process management form submissions for showing, updating, or deleting entries, or showing
+    every field of one entry.
     """
     form = await request.form()
-    if "show" in form:
-        entries = retrieve_entries(form)
+    collection = request.app.state.collection
+    redis_client = request.app.state.redis_client
+    if "show" in form and wants_all_rows(form):
+        # Stream the table while the cursor is read, instead of building every row first.
+        context = {"request": request, "search_criteria": get_search_criteria(form), "columns": MANAGE_LIST_COLUMNS}
+        context["entries"] = search_rows_async(collection, form)
+        html = stream_templates.get_template("manage_post.html").generate_async(context)
+        return StreamingResponse(buffer_chunks_async(html), media_type="text/html")
+    elif "show" in form:
+        page = await retrieve_entries(collection, form)
         search_criteria = get_search_criteria(form)
-        return templates.TemplateResponse(
-            "manage_post.html", {"request": request, "search_criteria": search_criteria, "entries": entries}
-        )
+        context = {"request": request, "search_criteria": search_criteria, "entries": page.entries, "page": page}
+        context["columns"] = MANAGE_LIST_COLUMNS
+        return templates.TemplateResponse("manage_post.html", context)
+    elif "details" in form:
+        try:
+            patient_id = int(form.get("patient_id"))
+        except (TypeError, ValueError):
+            message = "Invalid operation: Invalid patient ID."
+            return templates.TemplateResponse("manage_post.html", {"request": request, "message": message})
+        details = await retrieve_details(collection, patient_id)
+        if details is None:
+            message = f"No entry with Patient ID {patient_id}."
+            return templates.TemplateResponse("manage_post.html", {"request": request, "message": message})
+        context = {"request": request, "details": details, "columns": DETAIL_COLUMNS}
+        return templates.TemplateResponse("manage_post.html", context)
     elif "update" in form:
         if not any(form.values()):
             message = "Invalid operation: Nothing to update."
@@ -698,7 +737,7 @@ async def manage_post(request: Request):
             "email": form.get("email"),
             # Add additional fields if needed.
         }
-        updated_count = update_entry(patient_id, new_data)
+        updated_count = await update_entry(collection, redis_client, patient_id, new_data)
         message = (
             f"Entry with Patient ID {patient_id} successfully updated."
             if updated_count == 1
@@ -714,7 +753,7 @@ async def manage_post(request: Request):
         except (TypeError, ValueError):
             pass
             # raise HTTPException(status_code=400, detail="Invalid patient ID.")
-        deleted_count = delete_entry(patient_id)
+        deleted_count = await delete_entry(collection, redis_client, patient_id)
         message = (
             f"Entry with Patient ID {patient_id} successfully deleted."
             if deleted_count == 1
@@ -731,46 +770,69 @@ def get_search_criteria(form_data) -> str:
     """
     search_criteria = []
     for field, value in form_data.items():
-        if value and field != "show":
+        if value and field in SEARCH_FIELDS:
             search_criteria.append(f"{field}: {value}")
     return " and ".join(search_criteria)
 
 
-def retrieve_entries(form_data):
+async def retrieve_entries(collection, form_data) -> SearchPage:
     """
-    Retrieve database entries based on form input criteria.
+    Retrieve one page of database entries based on form input criteria (see feedback_search.search_page).
     """
-    query = {}
-    for field, value in form_data.items():
-        if value:
-            if field in ["patient_id", "age"]:
-                query[field] = int(value)
-            elif field == "name":
-                query[field] = re.compile(re.escape(value), re.IGNORECASE)
-            else:
-                query[field] = value
-    entries = collection.find(query)
-    return list(entries)
+    return await search_page_async(collection, form_data)
+
+
+async def retrieve_details(collection, patient_id):
+    """
+    Retrieve every shown field of one database entry, for the details view of a search result.
+    """
+    return await find_details_async(collection, patient_id)
 
 
-def update_entry(patient_id, new_data) -> int:
+async def update_entry(collection, redis_client, patient_id, new_data) -> int:
     """
     Update an entry in the database.
     """
-    existing_data = collection.find_one({"patient_id": patient_id})
+    existing_data = await collection.find_one({"patient_id": patient_id})
+    if existing_data is None:
+        return 0
+    updated_data = dict(existing_data)
     for key, value in new_data.items():
         if value:
-            existing_data[key] = value
-    result = collection.update_one({"patient_id": patient_id}, {"$set": existing_data})
+            updated_data[key] = value
+    updated_data.update(search_keys(updated_data))
+    write_token = await begin_write_async(redis_client)
+    result = await collection.update_one({"patient_id": patient_id}, {"$set": updated_data})
+
+    # Move any changed ratings or answers to their new counter buckets.
+    pipe = redis_client.pipeline()
+    if result.modified_count:
+        adjust_counters(pipe, existing_data, updated_data)
+        bump_data_version(pipe)
+    end_write(pipe, write_token)
+    await pipe.execute()
     return result.modified_count
 
 
-def delete_entry(patient_id) -> int:
+async def delete_entry(collection, redis_client, patient_id) -> int:
     """
     Delete an entry from the database.
     """
-    result = collection.delete_one({"patient_id": patient_id})
-    return result.deleted_count
+    write_token = await begin_write_async(redis_client)
+    deleted_data = await collection.find_one_and_delete({"patient_id": patient_id})
+    if deleted_data is None:
+        await end_write(redis_client, write_token)
+        return 0
+
+    # Remove the deleted ratings and answers from the chart counters, and the Redis copy of the
+    # record, which write-behind submissions also use as their duplicate check.
+    pipe = redis_client.pipeline()
+    update_counters(pipe, deleted_data, -1)
+    pipe.delete(f"data:{patient_id}")
+    bump_data_version(pipe)
+    end_write(pipe, write_token)
+    await pipe.execute()
+    return 1
 
 
 # if __name__ == "__main__":
@@ -5,52 +5,119 @@ This application collects patient feedback, stores it in MongoDB and Redis,
 and generates various charts (bar graphs and pie charts) for analysis.
 """
 
+import functools
+import io
 import json
 import os
-import re
-
-import matplotlib
-import matplotlib.pyplot as plt
-import numpy as np
-from flask import Flask, redirect, render_template, request, session, url_for
-
-from db_clients import create_mongo_db_client, create_redis_client
-
-# Configure matplotlib to use a backend suitable for environments without a display server.
-matplotlib.use("agg")
-
-
-def set_db_clients() -> tuple:
+import threading
+
+from flask import (
+    Flask,
+    Response,
+    abort,
+    jsonify,
+    make_response,
+    redirect,
+    render_template,
+    request,
+    session,
+    stream_template,
+    stream_with_context,
+    url_for,
+)
+from pymongo.errors import DuplicateKeyError
+
+import svg_charts
+from bulk_ingest import ingest_lines
+from chart_cache import ChartCache
+from chart_executor import ChartExecutor
+from dashboard_prerender import (
+    PRERENDER_MODE,
+    bargraph_grid_spec,
+    bargraph_specs,
+    load_dashboard_stats,
+    piechart_grid_spec,
+    piechart_specs,
+    ranking_grid_spec,
+    ranking_specs,
+    read_dashboard_version,
+    start_prerender_thread,
+)
+from db_clients import get_feedback_collection, get_redis_client
+from feedback_records import build_feedback_filter, build_feedback_record, to_document
+from feedback_search import (
+    DETAIL_COLUMNS,
+    MANAGE_LIST_COLUMNS,
+    SEARCH_FIELDS,
+    SearchPage,
+    buffer_chunks,
+    find_details,
+    search_keys,
+    search_page,
+    search_rows,
+    wants_all_rows,
+)
+from feedback_stats import (
+    RATING_COLS,
+    adjust_counters,
+    begin_write,
+    bump_data_version,
+    end_write,
+    update_counters,
+)
+from write_behind import WRITE_BEHIND_ENABLED, enqueue_feedback
+
+
+def get_db_clients() -> tuple:
     """
-    Initialize and return MongoDB and Redis clients.
+    Return this process's Feedback collection and Redis client.
+
+    Nothing connects at import time: the clients (and the collection's indexes) are created the
+    first time a request needs them, from the environment settings read by db_clients.
 
     Returns:
-        tuple: (MongoDB_Client, redis_client)
+        tuple: (collection, redis_client)
     """
-    # Retrieve MongoDB credentials from environment variables
-    username = os.getenv("USER_NAME")
-    password = os.getenv("PASSWORD_MONGODB")
-    MongoDB_Client = create_mongo_db_client(username, password)
+    return get_feedback_collection(), get_redis_client()
 
-    # Retrieve Redis configuration from environment variables (with defaults)
-    redis_host = os.getenv("REDIS_HOST", "localhost")
-    redis_port = int(os.getenv("REDIS_PORT"))
-    redis_password = None  # Update if a Redis password is required
-    redis_client = create_redis_client(redis_host=redis_host, redis_port=redis_port, redis_password=redis_password)
 
-    return MongoDB_Client, redis_client
+# Initialize the Flask app
+app = Flask(__name__)
+app.secret_key = os.urandom(24)  # Secret key for session management
 
+# In-memory cache of rendered chart images, reused while the underlying counts are unchanged
+# (CHART_CACHE_BACKEND=redis shares them between worker processes through Redis)
+chart_cache = ChartCache(
+    max_entries=int(os.getenv("CHART_CACHE_SIZE", 256)),
+    get_redis=get_redis_client if os.getenv("CHART_CACHE_BACKEND", "memory").lower() == "redis" else None,
+    ttl=int(os.getenv("CHART_CACHE_TTL", 3600)),
+)
 
-# Initialize database clients
-MONGODB_CLIENT, redis_client = set_db_clients()
+# Worker processes that draw the charts of a page in parallel (started on the first cache miss)
+chart_executor = ChartExecutor(max_workers=int(os.getenv("CHART_RENDER_WORKERS", 0)) or None)
 
-# Select the MongoDB database and collection
-db = MONGODB_CLIENT["Naseeb"]
-collection = db["Feedback"]
+# Pre-render threads started in this process, keyed by process ID (a forked worker starts its own)
+_prerender_threads = {}
+_prerender_lock = threading.Lock()
 
-# Initialize the Flask app
-app = Flask(__name__)
-app.secret_key = os.urandom(24)  # Secret key for session management
+
+@app.before_request
+def start_dashboard_prerender() -> None:
+    """
+    Start the background thread rebuilding the dashboard charts (DASHBOARD_PRERENDER=thread) on the
+    first request a process serves; the chart routes then serve the latest snapshot, whose charts
+    are already cached.
+
+    It is never started at import: chart worker processes re-import the main module, and the
+    reloader's parent process imports it too, but neither serves requests.
+    """
+    if PRERENDER_MODE != "thread" or os.getpid() in _prerender_threads:
+        return
+    with _prerender_lock:
+        if os.getpid() not in _prerender_threads:
+            _prerender_threads[os.getpid()] = start_prerender_thread(
+                get_db_clients, chart_cache, chart_executor.render_many
+            )
 
 
 # ----------------------------
@@ -62,75 +129,69 @@ def feedback():
     Render the feedback form and process submissions.
     Stores feedback data in both Redis and MongoDB.
     """
+    collection, redis_client = get_db_clients()
     if request.method == "POST":
-        # Retrieve and process form data
-        patient_id = int(request.form["patient_id"])
+        # Validate the form data and build the feedback document
+        try:
+            feedback_data = build_feedback_record(request.form)
+        except ValueError as e:
+            abort(400, description=str(e))
+        patient_id = feedback_data["patient_id"]
+
+        # Prevent duplicate submissions from the same browser session
+        if "patient_id" in session:
+            return redirect(url_for("feedback_error"))
 
-        # Prevent duplicate submissions by checking session and database
-        if "patient_id" in session or collection.find_one({"patient_id": patient_id}):
+        if WRITE_BEHIND_ENABLED:
+            # Claim the data key (it doubles as the duplicate check) and queue the record for the
+            # write-behind worker, so the patient never waits on MongoDB
+            if not redis_client.set(f"data:{patient_id}", json.dumps(feedback_data), nx=True):
+                return redirect(url_for("feedback_error"))
+            session["patient_id"] = patient_id
+            enqueue_feedback(redis_client, feedback_data)
+            return redirect(url_for("feedback_thankyou"))
+
+        # Insert data into MongoDB (a copy, so the generated _id stays out of the Redis JSON);
+        # the unique patient_id index rejects duplicate submissions
+        write_token = begin_write(redis_client)
+        try:
+            collection.insert_one(to_document(feedback_data))
+        except DuplicateKeyError:
+            end_write(redis_client, write_token)
             return redirect(url_for("feedback_error"))
 
         # Store patient_id in session to mark submission
         session["patient_id"] = patient_id
 
-        # Extract additional feedback details from the form
-        name = request.form["name"]
-        age = int(request.form["age"])
-        email = request.form["email"]
-        date = request.form["date"]
-
-        overall_exp = int(request.form["overall_exp"])
-        doc_care = int(request.form["doc_care"])
-        doc_comm = int(request.form["doc_comm"])
-        nurse_care = int(request.form["nurse_care"])
-        food_quality = int(request.form["food_quality"])
-        accommodation = int(request.form["accommodation"])
-        sanitization = int(request.form["sanitization"])
-        safety = int(request.form["safety"])
-        staff_support = int(request.form["staff_support"])
-        doc_involvement = request.form["doc_involvement"]
-        nurse_promptness = request.form["nurse_promptness"]
-        cleanliness = request.form["cleanliness"]
-        timely_info = request.form["timely_info"]
-        med_info = request.form["med_info"]
-        other_comments = request.form["other_comments"]
-
-        # Build a dictionary with the feedback data
-        feedback_data = {
-            "patient_id": patient_id,
-            "name": name,
-            "age": age,
-            "email": email,
-            "date": date,
-            "overall_exp": overall_exp,
-            "doc_care": doc_care,
-            "doc_comm": doc_comm,
-            "nurse_care": nurse_care,
-            "food_quality": food_quality,
-            "accommodation": accommodation,
-            "sanitization": sanitization,
-            "safety": safety,
-            "staff_support": staff_support,
-            "doc_involvement": doc_involvement,
-            "nurse_promptness": nurse_promptness,
-            "cleanliness": cleanliness,
-            "timely_info": timely_info,
-            "med_info": med_info,
-            "other_comments": other_comments,
-        }
-
-        # Save data in Redis (as a JSON string)
+        # Save data in Redis (as a JSON string) and update the chart counters in one pipeline
         data_json = json.dumps(feedback_data)
-        redis_client.set(f"data:{feedback_data['patient_id']}", data_json)
-
-        # Insert data into MongoDB
-        collection.insert_one(feedback_data)
+        pipe = redis_client.pipeline()
+        pipe.set(f"data:{feedback_data['patient_id']}", data_json)
+        update_counters(pipe, feedback_data)
+        bump_data_version(pipe)
+        end_write(pipe, write_token)
+        pipe.execute()
 
         return redirect(url_for("feedback_thankyou"))
     else:
         return render_template("feedback.html")
 
 
+@app.route("/feedback/bulk", methods=["POST"])
+def feedback_bulk():
+    """
+    Ingest many feedback records from an NDJSON (default) or CSV (Content-Type: text/csv) body.
+    The body is read and written in batches while one JSON result per record is streamed back.
+    """
+    collection, redis_client = get_db_clients()
+    fmt = "csv" if request.mimetype == "text/csv" else "ndjson"
+    lines = io.TextIOWrapper(request.stream, encoding="utf-8", newline="")
+    results = ingest_lines(collection, redis_client, lines, fmt)
+    return Response(
+        stream_with_context(json.dumps(result) + "\n" for result in results), mimetype="application/x-ndjson"
+    )
+
+
 @app.route("/feedback-thankyou")
 def feedback_thankyou():
     """Render the thank-you page after successful feedback submission."""
@@ -152,371 +213,207 @@ def home():
 # ----------------------------
 # Routes for Graph Generation
 # ----------------------------
+# Chart images are named after a hash of their data, so a URL always serves the same bytes
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def conditional_on_data_version(view):
+    """
+    Let a chart view answer `If-None-Match` with 304 Not Modified while the feedback data is
+    unchanged, before any counts are loaded or charts drawn. Other responses carry the data
+    version as their ETag and the time of the last write as Last-Modified.
+    """
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return view(*args, **kwargs)
+        version, modified = read_dashboard_version(get_redis_client(), stats_filter())
+        # The renderer changes the page markup, so it is part of the tag
+        renderer = "svg" if svg_charts.SVG_ENABLED else "png"
+        etag = f"{version}-{modified}-{renderer}"
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        else:
+            response = make_response(view(*args, **kwargs))
+        response.set_etag(etag)
+        response.last_modified = modified
+        response.cache_control.no_cache = True  # Always revalidate, which is cheap
+        return response
+
+    return wrapper
+
+
+def dashboard_requested() -> bool:
+    """
+    Check whether the page should draw its charts in the browser (`?mode=dashboard`).
+    The page then only loads /api/stats, so the server renders no images for it.
+    """
+    return request.args.get("mode") == "dashboard"
+
+
+def grid_requested() -> bool:
+    """
+    Check whether the page should show its charts as one composite image (`?mode=grid`),
+    which is encoded once and fetched in a single request.
+    """
+    return request.args.get("mode") == "grid"
+
+
+def stats_filter() -> dict:
+    """
+    Build the MongoDB filter for the optional `from` / `to` (YYYY-MM-DD) and `department` query
+    parameters, so the charts count only the matching feedback. Aborts with 400 on an invalid date.
+    """
+    try:
+        return build_feedback_filter(request.args)
+    except ValueError as e:
+        abort(400, description=str(e))
+
+
+def render_grid_chart(spec) -> str:
+    """Render a page's composite chart (or reuse it from the chart cache) and return its URL."""
+    [name] = chart_cache.get_or_render_many([spec], chart_executor.render_many)
+    return url_for("chart_image", name=name)
+
+
+def render_page_charts(specs) -> list:
+    """
+    Draw a page's charts as inline SVG, falling back to matplotlib PNGs (rendered in parallel and
+    cached) for charts the SVG renderer cannot draw or when CHART_RENDERER=matplotlib.
+    Returns, per spec, either the SVG markup or the URL the PNG is served from.
+    """
+    charts = svg_charts.render_many(specs)
+    fallback = [i for i, chart in enumerate(charts) if chart is None]
+    if fallback:
+        names = chart_cache.get_or_render_many([specs[i] for i in fallback], chart_executor.render_many)
+        for i, name in zip(fallback, names):
+            charts[i] = url_for("chart_image", name=name)
+    return charts
+
+
 @app.route("/bargraphs", methods=["GET", "POST"])
+@conditional_on_data_version
 def bargraphs():
     """
     Generate bar graphs for rating and yes/no responses.
     Returns a page displaying the generated graphs.
     """
-    # Define rating columns for star ratings
-    rating_cols = [
-        "overall_exp",
-        "doc_care",
-        "doc_comm",
-        "nurse_care",
-        "food_quality",
-        "accommodation",
-        "sanitization",
-        "safety",
-        "staff_support",
-    ]
-    # Container to store paths for generated bar graph images
-    bargraph_paths = ["Not a String"]
-
-    def bar_graph_rating(col_name):
-        """
-        Generate a bar graph for a specific rating column.
-        Returns the total number of ratings.
-        """
-        ratings = collection.find({}, {"_id": 0, col_name: 1})
-        # Initialize star counters
-        counts = {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
-
-        for rating in ratings:
-            star = rating.get(col_name)
-            if star in counts:
-                counts[star] += 1
-
-        # Bar graph data
-        x_labels = ["1 Star", "2 Star", "3 Star", "4 Star", "5 Star"]
-        y_values = [counts[1], counts[2], counts[3], counts[4], counts[5]]
-
-        # Plot the bar graph with count labels
-        plt.bar(x_labels, y_values)
-        for i, count in enumerate(y_values):
-            plt.text(i, count, str(count), ha="center", va="bottom")
-        plt.title(col_name)
-        plt.xlabel("Rating")
-        plt.ylabel("Number of Patients")
-
-        # Ensure static directory exists
-        if not os.path.exists("static"):
-            os.makedirs("static")
-        image_path = f"static/bar_graph_{col_name}.png"
-        bargraph_paths.append(image_path)
-        plt.savefig(image_path)
-        plt.close()
-        return sum(y_values)
-
-    # Generate bar graphs for rating columns
+    if dashboard_requested():
+        return render_template("bargraph.html", dashboard="bargraphs", title="Bar Graph Analysis")
+
+    collection, redis_client = get_db_clients()
+    # Read every rating and yes/no count from the Redis counters (or the pre-rendered snapshot),
+    # or count the filtered feedback in MongoDB
+    stats = load_dashboard_stats(collection, redis_client, stats_filter())
+
+    # Describe a bar graph for each rating column and a stacked bar graph for yes/no responses
+    specs = bargraph_specs(stats)
     total_ratings = 0
-    for col in rating_cols:
-        total_ratings = bar_graph_rating(col)
-
-    # Generate bar graph for yes/no responses
-    yes_no_paths = ["Not a string"]
-
-    def bar_graph_yes_no():
-        """
-        Generate a stacked bar graph for yes/no questions.
-        """
-        # Define yes/no columns
-        yes_no_cols = ["doc_involvement", "nurse_promptness", "cleanliness", "timely_info", "med_info"]
-        counts_yes = [0] * len(yes_no_cols)
-        counts_no = [0] * len(yes_no_cols)
-
-        # Count yes/no responses for each question
-        for doc in collection.find():
-            for i, col in enumerate(yes_no_cols):
-                if doc.get(col) == "yes":
-                    counts_yes[i] += 1
-                elif doc.get(col) == "no":
-                    counts_no[i] += 1
-
-        # Plot the stacked bar graph for yes/no responses
-        x_indices = range(len(yes_no_cols))
-        plt.bar(x_indices, counts_yes, label="Yes")
-        plt.bar(x_indices, counts_no, bottom=counts_yes, label="No")
-        for i, count in enumerate(counts_yes):
-            plt.text(i, count, str(count), ha="center", va="bottom")
-        for i, count in enumerate(counts_no):
-            plt.text(i, count + counts_yes[i], str(count), ha="center", va="bottom")
-
-        plt.title("Responses to Yes/No Questions")
-        plt.xlabel("Question")
-        plt.ylabel("Count")
-        plt.xticks(x_indices, yes_no_cols)
-        plt.legend()
-
-        if not os.path.exists("static"):
-            os.makedirs("static")
-        image_path = "static/bar_graph_yes_no.png"
-        yes_no_paths.append(image_path)
-        plt.gcf().set_size_inches(15, 8)
-        plt.savefig(image_path, dpi=100, bbox_inches="tight")
-        plt.close()
-
-    bar_graph_yes_no()
+    for col in RATING_COLS:
+        total_ratings = stats.rating_total(col)
 
     title = f"Bar Graph Analysis (Total Ratings = {total_ratings})"
-    return render_template(
-        "bargraph.html",
-        image_path1=bargraph_paths[1],
-        image_path2=bargraph_paths[2],
-        image_path3=bargraph_paths[3],
-        image_path4=bargraph_paths[4],
-        image_path5=bargraph_paths[5],
-        image_path6=bargraph_paths[6],
-        image_path7=bargraph_paths[7],
-        image_path8=bargraph_paths[8],
-        image_path9=bargraph_paths[9],
-        image_path11=yes_no_paths[1],
-        title=title,
-    )
+    if grid_requested():
+        return render_template("bargraph.html", grid=render_grid_chart(bargraph_grid_spec(specs)), title=title)
+
+    # Draw the charts as inline SVG (or render PNGs when falling back to matplotlib)
+    *bargraph_charts, yes_no_chart = render_page_charts(specs)
+    return render_template("bargraph.html", bargraphs=bargraph_charts, yes_no=yes_no_chart, title=title)
 
 
 @app.route("/piecharts", methods=["GET", "POST"])
+@conditional_on_data_version
 def piecharts():
     """
     Generate pie charts for rating and yes/no responses.
     Returns a page displaying the generated pie charts.
     """
-    # Define rating columns for pie charts
-    rating_cols = [
-        "overall_exp",
-        "doc_care",
-        "doc_comm",
-        "nurse_care",
-        "food_quality",
-        "accommodation",
-        "sanitization",
-        "safety",
-        "staff_support",
-    ]
-    piechart_paths = ["Not a String"]
-
-    def piechart_rating(col_name):
-        """
-        Generate a pie chart for a rating column.
-        Returns the total ratings for that column.
-        """
-        one_star = collection.count_documents({col_name: 1})
-        two_star = collection.count_documents({col_name: 2})
-        three_star = collection.count_documents({col_name: 3})
-        four_star = collection.count_documents({col_name: 4})
-        five_star = collection.count_documents({col_name: 5})
-        total_ratings = one_star + two_star + three_star + four_star + five_star
-
-        # Pie chart details
-        labels = ["1 Star", "2 Star", "3 Star", "4 Star", "5 Star"]
-        sizes = [one_star, two_star, three_star, four_star, five_star]
-        plt.clf()
-        patches, _ = plt.pie(sizes, startangle=90)
-        plt.axis("equal")
-        plt.title(f"{col_name} Rating")
-
-        # Create legend with counts and percentages
-        percentages = [f"{size} ({size / total_ratings * 100:.1f}%)" for size in sizes]
-        legend_labels = [f"{label}\n{perc}" for label, perc in zip(labels, percentages)]
-        plt.legend(patches, legend_labels, title="Star Ratings")
-
-        if not os.path.exists("static"):
-            os.makedirs("static")
-        image_path = f"static/piechart_{col_name}.png"
-        piechart_paths.append(image_path)
-        plt.savefig(image_path)
-        plt.close()
-        return total_ratings
-
-    yes_no_paths = ["Not a string"]
-
-    def piechart_yes_no():
-        """
-        Generate pie charts for yes/no questions.
-        """
-
-        def count_yes_no(question):
-            yes_count = collection.count_documents({question: "yes"})
-            no_count = collection.count_documents({question: "no"})
-            return yes_count, no_count
-
-        def plot_pie(question):
-            yes_count, no_count = count_yes_no(question)
-            total_count = yes_count + no_count
-            labels = ["Yes", "No"]
-            values = [yes_count, no_count]
-            percentages = [f"{count} ({count / total_count * 100:.1f}%)" for count in values]
-            plt.clf()
-            fig, ax = plt.subplots()
-            patches, _ = ax.pie(values)
-            ax.set_title(question)
-            legend_labels = [f"{label}\n{perc}" for label, perc in zip(labels, percentages)]
-            ax.legend(patches, legend_labels)
-            if not os.path.exists("static"):
-                os.makedirs("static")
-            image_path = f"static/piechart_yes_no_{question}.png"
-            yes_no_paths.append(image_path)
-            plt.savefig(image_path)
-            plt.close()
-
-        questions = ["doc_involvement", "nurse_promptness", "cleanliness", "timely_info", "med_info"]
-        for question in questions:
-            plot_pie(question)
+    if dashboard_requested():
+        return render_template("piechart.html", dashboard="piecharts", title="Pie Chart Analysis")
 
+    collection, redis_client = get_db_clients()
+    # Read every rating and yes/no count from the Redis counters (or the pre-rendered snapshot),
+    # or count the filtered feedback in MongoDB
+    stats = load_dashboard_stats(collection, redis_client, stats_filter())
+
+    # Describe pie charts for rating columns and yes/no questions
+    specs = piechart_specs(stats)
     total_ratings = 0
-    count_val = 0
-    for col in rating_cols:
-        total_ratings += piechart_rating(col)
-        count_val += 1
-    piechart_yes_no()
-    average_ratings = total_ratings // count_val if count_val else 0
+    for col in RATING_COLS:
+        total_ratings += stats.rating_total(col)
+
+    average_ratings = total_ratings // len(RATING_COLS)
 
     title = f"Pie Chart Analysis (Total Ratings = {average_ratings})"
-    return render_template(
-        "piechart.html",
-        image_path1=piechart_paths[1],
-        image_path2=piechart_paths[2],
-        image_path3=piechart_paths[3],
-        image_path4=piechart_paths[4],
-        image_path5=piechart_paths[5],
-        image_path6=piechart_paths[6],
-        image_path7=piechart_paths[7],
-        image_path8=piechart_paths[8],
-        image_path9=piechart_paths[9],
-        image_path11=yes_no_paths[1],
-        image_path12=yes_no_paths[2],
-        image_path13=yes_no_paths[3],
-        image_path14=yes_no_paths[4],
-        image_path15=yes_no_paths[5],
-        title=title,
-    )
+    if grid_requested():
+        return render_template("piechart.html", grid=render_grid_chart(piechart_grid_spec(specs)), title=title)
+
+    # Draw them as inline SVG (or render PNGs when falling back to matplotlib)
+    page_charts = render_page_charts(specs)
+    piechart_charts, yes_no_charts = page_charts[: len(RATING_COLS)], page_charts[len(RATING_COLS) :]
+    return render_template("piechart.html", piecharts=piechart_charts, yes_no=yes_no_charts, title=title)
 
 
 @app.route("/overall_bargraphs", methods=["GET", "POST"])
+@conditional_on_data_version
 def overall_bargraphs():
     """
     Generate overall bar graphs combining star ratings and yes/no responses.
     Returns a page displaying the generated bar graphs.
     """
+    title = "Overall Bar Graph Analysis"
+    if dashboard_requested():
+        return render_template("overall_bargraph.html", dashboard="overall_bargraphs", title=title)
 
-    def save_bar_graphs_():
-        """
-        Generate and save bar graphs for star ratings and yes/no responses.
-        Returns:
-            list: Paths of the generated bar graph images.
-        """
-        star_ratings = [1, 2, 3, 4, 5]
-        rating_cols = [
-            "overall_exp",
-            "doc_care",
-            "doc_comm",
-            "nurse_care",
-            "food_quality",
-            "accommodation",
-            "sanitization",
-            "safety",
-            "staff_support",
-        ]
-        # Define yes/no columns
-        yes_no_cols = ["doc_involvement", "nurse_promptness", "cleanliness", "timely_info", "med_info"]
-
-        # Initialize counters for star ratings and yes/no responses
-        ratings_counts = [[] for _ in range(len(star_ratings))]
-        yes_no_counts = [[], []]
-        x_labels = []
-
-        # Count occurrences for each rating column
-        for col in rating_cols:
-            for i, star in enumerate(star_ratings):
-                count = collection.count_documents({col: star})
-                ratings_counts[i].append(count)
-            x_labels.append(col)
-
-        # Count occurrences for each yes/no column
-        for col in yes_no_cols:
-            yes_count = collection.count_documents({col: "yes"})
-            no_count = collection.count_documents({col: "no"})
-            yes_no_counts[0].append(yes_count)
-            yes_no_counts[1].append(no_count)
-            x_labels.append(f"{col} (Yes/No)")
-
-        # Sort counts and labels for each star rating in decreasing order
-        sorted_counts = []
-        sorted_labels = []
-        for i in range(len(star_ratings)):
-            indices = np.argsort(ratings_counts[i])[::-1]
-            sorted_counts.append([ratings_counts[i][j] for j in indices])
-            sorted_labels.append([x_labels[j] for j in indices])
-
-        # Sort counts and labels for yes/no columns in decreasing order
-        yes_indices = np.argsort(yes_no_counts[0])[::-1]
-        no_indices = np.argsort(yes_no_counts[1])[::-1]
-        sorted_counts.append([yes_no_counts[0][j] for j in yes_indices])
-        sorted_counts.append([yes_no_counts[1][j] for j in no_indices])
-        sorted_labels.append([x_labels[j] for j in yes_indices])
-        sorted_labels.append([x_labels[j] for j in no_indices])
-
-        image_paths = []
-
-        # Create bar graphs for each star rating
-        for i, star in enumerate(star_ratings):
-            plt.clf()
-            fig, ax = plt.subplots(figsize=(10, 6))
-            bars = plt.bar(range(len(sorted_counts[i])), sorted_counts[i])
-            plt.xlabel("Column")
-            plt.ylabel("Count")
-            plt.title(f"Count of {star}-Star Ratings by Column")
-            plt.xticks(range(len(sorted_counts[i])), sorted_labels[i], rotation="vertical")
-            plt.tight_layout()
-            for bar in bars:
-                plt.text(
-                    bar.get_x() + bar.get_width() / 2, bar.get_height(), int(bar.get_height()), ha="center", va="bottom"
-                )
-            if not os.path.exists("static"):
-                os.makedirs("static")
-            image_path = f"static/bargraph_{star}_star_ratings.png"
-            plt.savefig(image_path)
-            plt.close()
-            image_paths.append(image_path)
-
-        # Create bar graphs for yes/no responses
-        for i in range(2):
-            plt.clf()
-            fig, ax = plt.subplots(figsize=(10, 6))
-            bars = plt.bar(range(len(sorted_counts[i + len(star_ratings)])), sorted_counts[i + len(star_ratings)])
-            plt.xlabel("Column")
-            plt.ylabel("Count")
-            plt.title("Count of Yes/No Responses by Column")
-            plt.xticks(
-                range(len(sorted_counts[i + len(star_ratings)])),
-                sorted_labels[i + len(star_ratings)],
-                rotation="vertical",
-            )
-            plt.tight_layout()
-            for bar in bars:
-                plt.text(
-                    bar.get_x() + bar.get_width() / 2, bar.get_height(), int(bar.get_height()), ha="center", va="bottom"
-                )
-            path_img = "static/bargraph_yes_no_responses.png" if i == 0 else "static/bargraph_no_responses.png"
-            plt.savefig(path_img)
-            plt.close()
-            image_paths.append(path_img)
-
-        return image_paths
+    collection, redis_client = get_db_clients()
+    # Read every rating and yes/no count from the Redis counters (or the pre-rendered snapshot),
+    # or count the filtered feedback in MongoDB
+    stats = load_dashboard_stats(collection, redis_client, stats_filter())
 
-    title = "Overall Bar Graph Analysis"
-    image_paths = save_bar_graphs_()
-    return render_template(
-        "overall_bargraph.html",
-        image_path16=image_paths[0],
-        image_path17=image_paths[1],
-        image_path18=image_paths[2],
-        image_path19=image_paths[3],
-        image_path20=image_paths[4],
-        image_path21=image_paths[5],
-        image_path22=image_paths[6],
-        title=title,
-    )
+    # Describe a bar graph ranking the columns for each star rating, then for yes and no responses
+    specs = ranking_specs(stats)
+    if grid_requested():
+        return render_template("overall_bargraph.html", grid=render_grid_chart(ranking_grid_spec(specs)), title=title)
+
+    # Draw them as inline SVG (or render PNGs when falling back to matplotlib)
+    return render_template("overall_bargraph.html", bargraphs=render_page_charts(specs), title=title)
+
+
+@app.route("/api/stats")
+@conditional_on_data_version
+def api_stats():
+    """
+    Return every star-rating distribution, yes/no count and column ranking as JSON,
+    for dashboards that draw the charts in the browser. Accepts the same filters as the chart pages.
+    """
+    collection, redis_client = get_db_clients()
+    stats = load_dashboard_stats(collection, redis_client, stats_filter())
+    return jsonify(stats.to_payload())
+
+
+@app.route("/charts/<name>")
+def chart_image(name):
+    """
+    Serve a rendered chart image from the chart cache, with long-lived caching headers.
+    Returns 404 if the chart is not cached (e.g. it has been evicted).
+    """
+    if request.if_none_match.contains_weak(name):
+        response = Response(status=304)
+    else:
+        image = chart_cache.get(name)
+        if image is None:
+            abort(404)
+        response = Response(image, mimetype="image/png")
+    response.set_etag(name)
+    response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+
+@app.route("/chart_cache_stats")
+def chart_cache_stats():
+    """Report hit and miss counts for the chart image cache."""
+    return jsonify(chart_cache.stats())
 
 
 # ----------------------------
@@ -533,12 +430,32 @@ def manage():
 @app.route("/manage", methods=["POST"])
 def process_form():
     """
-    Process management form submissions for showing, updating, or deleting entries.
+    Process management form submissions for showing, updating, or deleting entries, or showing
+    every field of one entry.
     """
-    if "show" in request.form:
-        entries = retrieve_entries(request.form)
+    if "show" in request.form and wants_all_rows(request.form):
+        # Stream the table while the cursor is read, instead of building every row first
+        search_criteria = get_search_criteria(request.form)
+        entries = search_rows(get_feedback_collection(), request.form)
+        html = stream_template(
+            "manage.html", search_criteria=search_criteria, entries=entries, columns=MANAGE_LIST_COLUMNS
+        )
+        return Response(buffer_chunks(html), mimetype="text/html")
+    elif "show" in request.form:
+        page = retrieve_entries(request.form)
         search_criteria = get_search_criteria(request.form)
-        return render_template("manage.html", search_criteria=search_criteria, entries=entries)
+        return render_template(
+            "manage.html", search_criteria=search_criteria, entries=page.entries, page=page, columns=MANAGE_LIST_COLUMNS
+        )
+    elif "details" in request.form:
+        try:
+            patient_id = int(request.form.get("patient_id"))
+        except (TypeError, ValueError):
+            return render_template("manage.html", message="Invalid operation: Invalid patient ID.")
+        details = retrieve_details(patient_id)
+        if details is None:
+            return render_template("manage.html", message=f"No entry with Patient ID {patient_id}.")
+        return render_template("manage.html", details=details, columns=DETAIL_COLUMNS)
     elif "update" in request.form:
         if not any(request.form.values()):
             message = "Invalid operation: Nothing to update."
@@ -585,32 +502,36 @@ def get_search_criteria(form_data) -> str:
     """
     search_criteria = []
     for field, value in form_data.items():
-        if value and field != "show":
+        if value and field in SEARCH_FIELDS:
             search_criteria.append(f"{field}: {value}")
     return " and ".join(search_criteria)
 
 
-def retrieve_entries(form_data):
+def retrieve_entries(form_data) -> SearchPage:
     """
-    Retrieve database entries based on form input criteria.
+    Retrieve one page of database entries based on form input criteria.
 
     Args:
-        form_data (dict): The submitted form data.
+        form_data (dict): The submitted form data, including the page to show
+            (see feedback_search.search_page).
 
     Returns:
-        list: A list of entries matching the criteria.
+        SearchPage: The entries on the page and the links to the next and previous pages.
     """
-    query = {}
-    for field, value in form_data.items():
-        if value:
-            if field in ["patient_id", "age"]:
-                query[field] = int(value)
-            elif field == "name":
-                query[field] = re.compile(re.escape(value), re.IGNORECASE)
-            else:
-                query[field] = value
-    entries = collection.find(query)
-    return list(entries)
+    return search_page(get_feedback_collection(), form_data)
+
+
+def retrieve_details(patient_id):
+    """
+    Retrieve every shown field of one database entry, for the details view of a search result.
+
+    Args:
+        patient_id (int): The patient ID.
+
+    Returns:
+        dict: The entry, or None if there is none.
+    """
+    return find_details(get_feedback_collection(), patient_id)
 
 
 def update_entry(patient_id, new_data) -> int:
@@ -624,11 +545,25 @@ def update_entry(patient_id, new_data) -> int:
     Returns:
         int: The number of modified documents.
     """
+    collection, redis_client = get_db_clients()
     existing_data = collection.find_one({"patient_id": patient_id})
+    if existing_data is None:
+        return 0
+    updated_data = dict(existing_data)
     for key, value in new_data.items():
         if value:
-            existing_data[key] = value
-    result = collection.update_one({"patient_id": patient_id}, {"$set": existing_data})
+            updated_data[key] = value
+    updated_data.update(search_keys(updated_data))
+    write_token = begin_write(redis_client)
+    result = collection.update_one({"patient_id": patient_id}, {"$set": updated_data})
+
+    # Move any changed ratings or answers to their new counter buckets
+    pipe = redis_client.pipeline()
+    if result.modified_count:
+        adjust_counters(pipe, existing_data, updated_data)
+        bump_data_version(pipe)
+    end_write(pipe, write_token)
+    pipe.execute()
     return result.modified_count
 
 
@@ -642,8 +577,22 @@ def delete_entry(patient_id) -> int:
     Returns:
         int: The number of deleted documents.
     """
-    result = collection.delete_one({"patient_id": patient_id})
-    return result.deleted_count
+    collection, redis_client = get_db_clients()
+    write_token = begin_write(redis_client)
+    deleted_data = collection.find_one_and_delete({"patient_id": patient_id})
+    if deleted_data is None:
+        end_write(redis_client, write_token)
+        return 0
+
+    # Remove the deleted ratings and answers from the chart counters, and the Redis copy of the
+    # record, which write-behind submissions also use as their duplicate check
+    pipe = redis_client.pipeline()
+    update_counters(pipe, deleted_data, -1)
+    pipe.delete(f"data:{patient_id}")
+    bump_data_version(pipe)
+    end_write(pipe, write_token)
+    pipe.execute()
+    return 1
 
 
 if __name__ == "__main__":
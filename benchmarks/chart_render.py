@@ -0,0 +1,132 @@
+"""
+Chart Rendering Benchmark
+
+Compares drawing every chart kind from a new figure (CHART_TEMPLATES=0, the
+behaviour before figure templates) with reusing the pre-built figure
+templates and with the inline SVG renderer. For each kind it reports the
+median time per chart and the memory allocated while rendering one chart,
+plus the size of the SVG markup.
+
+    python benchmarks/chart_render.py
+    python benchmarks/chart_render.py --renders 50
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import charts  # noqa: E402
+import svg_charts  # noqa: E402
+from feedback_stats import RATING_COLS, YES_NO_COLS  # noqa: E402
+
+
+def sample_charts(rnd) -> list:
+    """Return one (kind, data) pair per chart kind with random counts, as the analysis pages draw them."""
+    ranking_labels = RATING_COLS[:]
+    rnd.shuffle(ranking_labels)
+    return [
+        ("bar_graph_rating", (rnd.choice(RATING_COLS), [rnd.randint(0, 500) for _ in range(5)])),
+        (
+            "bar_graph_yes_no",
+            (YES_NO_COLS, [rnd.randint(0, 500) for _ in YES_NO_COLS], [rnd.randint(0, 500) for _ in YES_NO_COLS]),
+        ),
+        ("piechart_rating", (rnd.choice(RATING_COLS), [rnd.randint(1, 500) for _ in range(5)])),
+        ("plot_pie", (rnd.choice(YES_NO_COLS), rnd.randint(1, 500), rnd.randint(1, 500))),
+        (
+            "ranking_bar_graph",
+            ("Count of 5-Star Ratings by Column", ranking_labels, sorted(rnd.sample(range(500), 9), reverse=True)),
+        ),
+    ]
+
+
+def measure(templates, renders) -> dict:
+    """
+    Time `renders` charts of every kind with templates on or off.
+
+    Returns:
+        dict: Per chart kind, the median seconds per chart and KiB allocated by one render.
+    """
+    charts.TEMPLATES_ENABLED = templates
+    rnd = random.Random(0)
+    timings = {}
+    for kind, data in sample_charts(rnd):
+        render = getattr(charts, kind)
+        render(*data)  # Warm up imports, fonts and (with templates) the template itself
+
+        durations = []
+        for _ in range(renders):
+            _, data = next(item for item in sample_charts(rnd) if item[0] == kind)
+            start = time.perf_counter()
+            render(*data)
+            durations.append(time.perf_counter() - start)
+
+        tracemalloc.start()
+        render(*data)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        timings[kind] = {"ms": round(statistics.median(durations) * 1000, 2), "peak_kib": round(peak / 1024)}
+    return timings
+
+
+def measure_svg(renders) -> dict:
+    """
+    Time `renders` SVG charts of every kind.
+
+    Returns:
+        dict: Per chart kind, the median microseconds per chart, KiB allocated by one render and
+        the size of the markup in bytes.
+    """
+    rnd = random.Random(0)
+    timings = {}
+    for kind, data in sample_charts(rnd):
+        render = svg_charts.SVG_CHARTS[kind]
+        durations = []
+        for _ in range(renders):
+            _, data = next(item for item in sample_charts(rnd) if item[0] == kind)
+            start = time.perf_counter()
+            markup = render(*data)
+            durations.append(time.perf_counter() - start)
+
+        tracemalloc.start()
+        render(*data)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        timings[kind] = {
+            "us": round(statistics.median(durations) * 1e6, 1),
+            "peak_kib": round(peak / 1024),
+            "bytes": len(markup.encode()),
+        }
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--renders", type=int, default=20, help="Charts of each kind rendered per measurement.")
+    args = parser.parse_args()
+
+    before = measure(False, args.renders)
+    after = measure(True, args.renders)
+    svg = measure_svg(args.renders)
+
+    print(f"{'chart':<20}{'new figure ms':>15}{'template ms':>13}{'speed-up':>10}{'new KiB':>10}{'template KiB':>14}")
+    for kind in before:
+        b, a = before[kind], after[kind]
+        print(f"{kind:<20}{b['ms']:>15}{a['ms']:>13}{b['ms'] / a['ms']:>9.2f}x{b['peak_kib']:>10}{a['peak_kib']:>14}")
+    print()
+    print(f"{'chart':<20}{'svg us':>10}{'svg KiB':>10}{'svg bytes':>12}")
+    for kind, s in svg.items():
+        print(f"{kind:<20}{s['us']:>10}{s['peak_kib']:>10}{s['bytes']:>12}")
+    print(json.dumps({"new_figure": before, "template": after, "svg": svg}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Start-up Time Benchmark
+
+Measures how long a fresh worker takes to import each app and to serve its
+first request, which is what every worker spawn and autoscale event pays.
+Each measurement runs in a new interpreter so nothing is already imported.
+
+    python benchmarks/startup_time.py
+    python benchmarks/startup_time.py --path /bargraphs --runs 5 --output startup.jsonl
+
+Results are printed as one JSON object per app. With --output they are also
+appended to a JSON Lines file, tagged with the git revision, so start-up time
+can be compared across releases.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+APPS = ["app_flask", "main", "app_fastapi"]
+
+# Modules whose presence after import shows start-up work that should have been deferred
+HEAVY_MODULES = ["matplotlib", "numpy"]
+
+# Runs inside a fresh interpreter: import the app, then serve one request, and report both timings
+MEASURE_SCRIPT = """
+import importlib, json, sys, time
+
+module_name, path, heavy_modules = sys.argv[1], sys.argv[2], sys.argv[3].split(",")
+start = time.perf_counter()
+module = importlib.import_module(module_name)
+imported = time.perf_counter()
+loaded = [name for name in heavy_modules if name in sys.modules]
+
+if module_name == "app_fastapi":
+    from fastapi.testclient import TestClient
+
+    # Entering the client runs the lifespan hook, so DB start-up counts towards the first request
+    with TestClient(module.app) as client:
+        status = client.get(path).status_code
+else:
+    status = module.app.test_client().get(path).status_code
+served = time.perf_counter()
+
+print(json.dumps({
+    "import_s": imported - start,
+    "first_request_s": served - imported,
+    "status": status,
+    "heavy_modules_at_import": loaded,
+}))
+"""
+
+
+def measure(app_name, path) -> dict:
+    """
+    Import one app and serve one request in a fresh interpreter.
+
+    Args:
+        app_name (str): Module name of the app.
+        path (str): Path requested after the import.
+
+    Returns:
+        dict: import_s, first_request_s, status and heavy_modules_at_import.
+    """
+    process = subprocess.run(
+        [sys.executable, "-c", MEASURE_SCRIPT, app_name, path, ",".join(HEAVY_MODULES)],
+        cwd=REPO_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if process.returncode != 0:
+        raise RuntimeError(f"Measuring {app_name} failed:\n{process.stderr}")
+    # The apps may print connection messages; the measurement is the last line
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def git_revision() -> str:
+    """Return the current commit hash, or "unknown" outside a git checkout."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--apps", nargs="+", default=APPS, help="App modules to measure.")
+    parser.add_argument("--path", default="/", help="Path of the first request.")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh interpreters per app; the median is reported.")
+    parser.add_argument("--output", help="Append results to this JSON Lines file.")
+    args = parser.parse_args()
+
+    revision = git_revision()
+    for app_name in args.apps:
+        runs = [measure(app_name, args.path) for _ in range(args.runs)]
+        result = {
+            "app": app_name,
+            "revision": revision,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "path": args.path,
+            "runs": args.runs,
+            "import_s": round(statistics.median(run["import_s"] for run in runs), 4),
+            "first_request_s": round(statistics.median(run["first_request_s"] for run in runs), 4),
+            "status": runs[-1]["status"],
+            "heavy_modules_at_import": runs[-1]["heavy_modules_at_import"],
+        }
+        print(json.dumps(result))
+        if args.output:
+            with open(args.output, "a") as f:
+                f.write(json.dumps(result) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Statistics Aggregation Benchmark
+
+Counts the star ratings and yes/no answers of synthetic feedback documents
+(as a projected cursor would yield them) three ways: the original per-column
+Python loops (one pass over the documents per rating column plus one for the
+yes/no answers), a single Python pass incrementing dicts, and the NumPy
+columns of feedback_columns (one pass picking fields, then np.bincount).
+All three must produce the same counts; the median time of each is reported.
+
+    python benchmarks/stats_aggregation.py
+    python benchmarks/stats_aggregation.py --documents 1000000 --runs 3
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from feedback_columns import columns_from_documents  # noqa: E402
+from feedback_stats import RATING_COLS, STAR_RATINGS, YES_NO_ANSWERS, YES_NO_COLS, FeedbackStats  # noqa: E402
+
+
+def sample_documents(count) -> list:
+    """Return `count` random documents holding only the chart fields."""
+    rnd = random.Random(0)
+    return [
+        {
+            **{col: rnd.randint(1, 5) for col in RATING_COLS},
+            **{col: rnd.choice(YES_NO_ANSWERS) for col in YES_NO_COLS},
+        }
+        for _ in range(count)
+    ]
+
+
+def per_column_loops(documents) -> FeedbackStats:
+    """Count the way the original routes did: one loop over the documents per column."""
+    ratings = {}
+    for col in RATING_COLS:
+        counts = {star: 0 for star in STAR_RATINGS}
+        for doc in documents:
+            if doc.get(col) in counts:
+                counts[doc[col]] += 1
+        ratings[col] = [counts[star] for star in STAR_RATINGS]
+    yes_no = {col: [0, 0] for col in YES_NO_COLS}
+    for doc in documents:
+        for col in YES_NO_COLS:
+            if doc.get(col) in YES_NO_ANSWERS:
+                yes_no[col][YES_NO_ANSWERS.index(doc[col])] += 1
+    return FeedbackStats(ratings=ratings, yes_no={col: tuple(counts) for col, counts in yes_no.items()})
+
+
+def single_pass(documents) -> FeedbackStats:
+    """Count every column in one loop over the documents."""
+    ratings = {col: [0] * len(STAR_RATINGS) for col in RATING_COLS}
+    yes_no = {col: [0, 0] for col in YES_NO_COLS}
+    for doc in documents:
+        for col in RATING_COLS:
+            star = doc.get(col)
+            if star in STAR_RATINGS:
+                ratings[col][star - 1] += 1
+        for col in YES_NO_COLS:
+            answer = doc.get(col)
+            if answer in YES_NO_ANSWERS:
+                yes_no[col][YES_NO_ANSWERS.index(answer)] += 1
+    return FeedbackStats(ratings=ratings, yes_no={col: tuple(counts) for col, counts in yes_no.items()})
+
+
+def numpy_columns(documents) -> FeedbackStats:
+    """Count with the NumPy columns, also computing the means and totals they offer."""
+    columns = columns_from_documents(documents)
+    columns.means()
+    columns.totals()
+    return columns.to_stats()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=200000, help="Number of synthetic documents.")
+    parser.add_argument("--runs", type=int, default=5, help="Measurements per method.")
+    args = parser.parse_args()
+
+    documents = sample_documents(args.documents)
+    methods = {"per_column_loops": per_column_loops, "single_pass": single_pass, "numpy_columns": numpy_columns}
+    expected = per_column_loops(documents)
+
+    results = {}
+    for name, method in methods.items():
+        durations = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            stats = method(documents)
+            durations.append(time.perf_counter() - start)
+        if stats != expected:
+            raise SystemExit(f"{name} counted differently")
+        results[name] = round(statistics.median(durations) * 1000, 1)
+
+    baseline = results["per_column_loops"]
+    print(f"{'method':<20}{'ms':>10}{'speed-up':>10}")
+    for name, ms in results.items():
+        print(f"{name:<20}{ms:>10}{baseline / ms:>9.1f}x")
+    print(json.dumps({"documents": args.documents, "ms": results}))
+
+
+if __name__ == "__main__":
+    main()
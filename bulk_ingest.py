@@ -0,0 +1,254 @@
+"""
+Bulk Feedback Ingestion
+
+Loads historical feedback (paper surveys, kiosk exports) from an NDJSON or CSV
+upload. The body is parsed one line at a time and written in batches, each
+batch costing one insert_many(ordered=False) round trip to MongoDB and one
+Redis pipeline. Results are produced per record as the upload is consumed, so
+neither the request nor the response is ever held in memory as a whole.
+"""
+
+import csv
+import json
+
+from pymongo.errors import BulkWriteError
+
+from feedback_records import build_feedback_record, to_document
+from feedback_stats import begin_write, begin_write_async, bump_data_version, end_write, update_counters
+
+# Number of records written per insert_many / Redis pipeline
+BULK_BATCH_SIZE = 1000
+
+# MongoDB error code for a unique index violation (duplicate patient_id)
+DUPLICATE_KEY_ERROR = 11000
+
+
+class FeedbackLineParser:
+    """
+    Converts the lines of an NDJSON or CSV upload into feedback records.
+
+    For CSV the first non-blank line is the header row. Each CSV record must
+    fit on one line (quoted values may not contain newlines).
+
+    Args:
+        fmt (str): "ndjson" or "csv".
+    """
+
+    def __init__(self, fmt="ndjson"):
+        self.fmt = fmt
+        self.header = None
+        self.line_number = 0
+
+    def parse(self, line):
+        """
+        Parse one line of the upload.
+
+        Args:
+            line (str): The line, with or without its trailing newline.
+
+        Returns:
+            tuple | None: (line_number, record, error) where exactly one of record and error
+            is None, or None for blank lines and the CSV header.
+        """
+        self.line_number += 1
+        line = line.strip("\r\n")
+        if not line.strip():
+            return None
+
+        try:
+            if self.fmt == "csv":
+                row = next(csv.reader([line]))
+                if self.header is None:
+                    self.header = [name.strip() for name in row]
+                    return None
+                fields = dict(zip(self.header, row))
+            else:
+                fields = json.loads(line)
+                if not isinstance(fields, dict):
+                    raise ValueError("Expected a JSON object")
+            return self.line_number, build_feedback_record(fields), None
+        except ValueError as e:  # json.JSONDecodeError is a ValueError
+            return self.line_number, None, str(e)
+
+
+def _result(line_number, status, patient_id=None, error=None) -> dict:
+    """Build the per-record result reported back to the client."""
+    result = {"line": line_number, "patient_id": patient_id, "status": status}
+    if error:
+        result["error"] = error
+    return result
+
+
+def _write_errors(error) -> dict:
+    """Map the index of each failed document in an insert_many call to its error message."""
+    return {
+        write_error["index"]: "Duplicate patient_id"
+        if write_error.get("code") == DUPLICATE_KEY_ERROR
+        else write_error.get("errmsg", "Write failed")
+        for write_error in error.details["writeErrors"]
+    }
+
+
+def _batch_results(batch, write_errors, pipe):
+    """
+    Build the results for an inserted batch and queue Redis writes for the accepted records.
+
+    Returns:
+        list: One result per record in `batch`.
+    """
+    results = []
+    for index, (line_number, record) in enumerate(batch):
+        if index in write_errors:
+            results.append(_result(line_number, "rejected", record["patient_id"], write_errors[index]))
+            continue
+        pipe.set(f"data:{record['patient_id']}", json.dumps(record))
+        update_counters(pipe, record)
+        results.append(_result(line_number, "accepted", record["patient_id"]))
+    if len(write_errors) < len(batch):
+        bump_data_version(pipe)
+    return results
+
+
+def write_batch(collection, redis_client, batch) -> list:
+    """
+    Insert a batch of records and mirror the accepted ones into Redis.
+
+    Args:
+        collection: The MongoDB Feedback collection.
+        redis_client: The Redis client.
+        batch (list): (line_number, record) pairs.
+
+    Returns:
+        list: One result per record in the batch.
+    """
+    write_errors = {}
+    write_token = begin_write(redis_client)
+    try:
+        # Insert copies so MongoDB's generated _id does not leak into the Redis JSON. Duplicates of
+        # stored or earlier records come back as write errors from the unique patient_id index.
+        collection.insert_many([to_document(record) for _, record in batch], ordered=False)
+    except BulkWriteError as e:
+        write_errors = _write_errors(e)
+
+    pipe = redis_client.pipeline()
+    results = _batch_results(batch, write_errors, pipe)
+    end_write(pipe, write_token)
+    pipe.execute()
+    return results
+
+
+async def write_batch_async(collection, redis_client, batch) -> list:
+    """
+    Async variant of `write_batch` for a Motor collection and an asyncio Redis client.
+    """
+    write_errors = {}
+    write_token = await begin_write_async(redis_client)
+    try:
+        # Insert copies so MongoDB's generated _id does not leak into the Redis JSON. Duplicates of
+        # stored or earlier records come back as write errors from the unique patient_id index.
+        await collection.insert_many([to_document(record) for _, record in batch], ordered=False)
+    except BulkWriteError as e:
+        write_errors = _write_errors(e)
+
+    pipe = redis_client.pipeline()
+    results = _batch_results(batch, write_errors, pipe)
+    end_write(pipe, write_token)
+    await pipe.execute()
+    return results
+
+
+def _summary(counts) -> dict:
+    """Final line of the response, totalling accepted and rejected records."""
+    return {"summary": counts}
+
+
+def ingest_lines(collection, redis_client, lines, fmt="ndjson", batch_size=BULK_BATCH_SIZE):
+    """
+    Parse and store an upload, yielding one result per record and a final summary.
+
+    Args:
+        collection: The MongoDB Feedback collection.
+        redis_client: The Redis client.
+        lines (Iterable[str]): Lines of the upload, read lazily.
+        fmt (str): "ndjson" or "csv".
+        batch_size (int): Number of records written per round trip.
+
+    Yields:
+        dict: Per-record results, then {"summary": {"accepted": ..., "rejected": ...}}.
+    """
+    parser = FeedbackLineParser(fmt)
+    counts = {"accepted": 0, "rejected": 0}
+    batch = []
+    for line in lines:
+        parsed = parser.parse(line)
+        if parsed is None:
+            continue
+        line_number, record, error = parsed
+        if error:
+            counts["rejected"] += 1
+            yield _result(line_number, "rejected", error=error)
+            continue
+
+        batch.append((line_number, record))
+        if len(batch) >= batch_size:
+            for result in write_batch(collection, redis_client, batch):
+                counts[result["status"]] += 1
+                yield result
+            batch = []
+
+    if batch:
+        for result in write_batch(collection, redis_client, batch):
+            counts[result["status"]] += 1
+            yield result
+    yield _summary(counts)
+
+
+async def ingest_lines_async(collection, redis_client, lines, fmt="ndjson", batch_size=BULK_BATCH_SIZE):
+    """
+    Async variant of `ingest_lines`; `lines` is an async iterable of str.
+    """
+    parser = FeedbackLineParser(fmt)
+    counts = {"accepted": 0, "rejected": 0}
+    batch = []
+    async for line in lines:
+        parsed = parser.parse(line)
+        if parsed is None:
+            continue
+        line_number, record, error = parsed
+        if error:
+            counts["rejected"] += 1
+            yield _result(line_number, "rejected", error=error)
+            continue
+
+        batch.append((line_number, record))
+        if len(batch) >= batch_size:
+            for result in await write_batch_async(collection, redis_client, batch):
+                counts[result["status"]] += 1
+                yield result
+            batch = []
+
+    if batch:
+        for result in await write_batch_async(collection, redis_client, batch):
+            counts[result["status"]] += 1
+            yield result
+    yield _summary(counts)
+
+
+async def aiter_lines(chunks):
+    """
+    Split an async stream of byte chunks (e.g. `request.stream()`) into decoded lines.
+
+    Args:
+        chunks (AsyncIterable[bytes]): The raw request body.
+
+    Yields:
+        str: One line at a time, without buffering more than one partial line.
+    """
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        *complete, pending = pending.split(b"\n")
+        for line in complete:
+            yield line.decode("utf-8")
+    if pending:
+        yield pending.decode("utf-8")
@@ -0,0 +1,158 @@
+"""
+Content-Addressed Chart Cache
+
+Charts are named after a hash of the chart type and the data drawn in it, and
+their PNG bytes are kept in memory. When the same chart is requested with the
+same data, the image rendered last time is reused instead of running matplotlib
+again, and the /charts/<name> route serves it straight from the cache, so
+neither rendering nor serving a chart touches the filesystem. The in-process
+cache is bounded: once it holds `max_entries` charts, the least recently used
+one is dropped.
+
+When several web workers (or nodes) serve the app, the page and its images may
+be requested from different processes. Give the cache a Redis client and every
+rendered chart is also stored in Redis (with an expiry), where any worker that
+misses locally finds it.
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+REDIS_KEY_PREFIX = "chart:"
+
+
+class ChartCache:
+    """
+    LRU cache of rendered chart images, keyed by chart type and input data.
+
+    Args:
+        max_entries (int): Maximum number of charts kept in this process.
+        get_redis (callable): Returns a Redis client to share charts through (e.g.
+            `db_clients.get_redis_client`); called on first use. None keeps charts in-process only.
+        ttl (int): Seconds a chart is kept in Redis.
+    """
+
+    def __init__(self, max_entries=256, get_redis=None, ttl=3600):
+        self.max_entries = max_entries
+        self.get_redis = get_redis
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # chart name -> PNG bytes, least recently used first
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(chart_type, data) -> str:
+        """
+        Hash a chart type and its input data into a cache key.
+
+        Args:
+            chart_type (str): Name of the chart, e.g. "piechart_rating".
+            data (tuple): Everything the chart is drawn from (titles, labels, counts).
+
+        Returns:
+            str: A hex digest identifying the chart.
+        """
+        payload = json.dumps([chart_type, data], separators=(",", ":"))
+        return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+    @classmethod
+    def make_name(cls, spec) -> str:
+        """Return the name a chart spec is cached and served under, e.g. "plot_pie_<key>.png"."""
+        return f"{spec.kind}_{cls.make_key(spec.kind, spec.data)}.png"
+
+    def get(self, name):
+        """
+        Return the PNG bytes of a cached chart.
+
+        Args:
+            name (str): The chart name, as returned by `get_or_render_many`.
+
+        Returns:
+            bytes: The image, or None if it is not (or no longer) cached.
+        """
+        with self._lock:
+            image = self._entries.get(name)
+            if image is not None:
+                self._entries.move_to_end(name)
+                return image
+        if self.get_redis is None:
+            return None
+
+        image = self.get_redis().get(REDIS_KEY_PREFIX + name)
+        if image is not None:
+            self._store_local({name: image})
+        return image
+
+    def get_or_render_many(self, specs, render_many) -> list:
+        """
+        Return the names of a batch of charts, rendering all cache misses in one call.
+
+        Args:
+            specs (list): ChartSpec objects (a rendering function name and its input data).
+            render_many (callable): Called with the list of specs that missed and returns their
+                PNG bytes, e.g. `ChartExecutor.render_many` to draw them in parallel.
+
+        Returns:
+            list: Chart names to pass to `get`, in the order of `specs`.
+        """
+        names = [self.make_name(spec) for spec in specs]
+        misses = {}  # name -> spec, so identical charts in a batch are drawn once
+        with self._lock:
+            for name, spec in zip(names, specs):
+                if name in self._entries:
+                    self._entries.move_to_end(name)
+                    self.hits += 1
+                elif name not in misses:
+                    misses[name] = spec
+
+        if misses and self.get_redis is not None:
+            # Charts another worker already rendered
+            redis_client = self.get_redis()
+            shared = redis_client.mget([REDIS_KEY_PREFIX + name for name in misses])
+            found = {name: image for name, image in zip(misses, shared) if image is not None}
+            for name in found:
+                del misses[name]
+            self._store_local(found)
+            with self._lock:
+                self.hits += len(found)
+
+        if misses:
+            with self._lock:
+                self.misses += len(misses)
+            rendered = dict(zip(misses, render_many(list(misses.values()))))
+            self._store_local(rendered)
+            if self.get_redis is not None:
+                with self.get_redis().pipeline(transaction=False) as pipe:
+                    for name, image in rendered.items():
+                        pipe.set(REDIS_KEY_PREFIX + name, image, ex=self.ttl)
+                    pipe.execute()
+        return names
+
+    def _store_local(self, images) -> None:
+        """Add charts (name -> PNG bytes) to this process's cache, dropping the least recently used."""
+        with self._lock:
+            for name, image in images.items():
+                self._entries[name] = image
+                self._entries.move_to_end(name)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        """
+        Report cache effectiveness.
+
+        Returns:
+            dict: Hit and miss counts, current size (in charts and bytes) and size bound.
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": sum(len(image) for image in self._entries.values()),
+                "max_entries": self.max_entries,
+                "shared": self.get_redis is not None,
+            }
@@ -0,0 +1,100 @@
+"""
+Parallel Chart Rendering
+
+The analytics pages draw 7 to 14 charts each. Rendering them one after
+another keeps a single core busy while the others sit idle, so charts are
+described as plain-data `ChartSpec`s and drawn by a pool of worker processes
+at the same time. Specs carry only the name of a charts.py function and its
+arguments, so they pickle cheaply and the workers never see app state; the
+workers send back the PNG bytes and never write files.
+"""
+
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from multiprocessing import get_context
+
+
+@dataclass(frozen=True)
+class ChartSpec:
+    """
+    Everything needed to draw one chart.
+
+    Attributes:
+        kind (str): Name of the charts.py rendering function, e.g. "bar_graph_rating".
+        data (tuple): The arguments passed to it (title, labels, counts).
+    """
+
+    kind: str
+    data: tuple
+
+
+def render_chart(spec) -> bytes:
+    """
+    Draw one chart. Runs inside a worker process.
+
+    Args:
+        spec (ChartSpec): The chart to draw.
+
+    Returns:
+        bytes: The PNG image.
+    """
+    import charts
+
+    return getattr(charts, spec.kind)(*spec.data)
+
+
+class ChartExecutor:
+    """
+    Process pool that renders batches of charts concurrently.
+
+    The pool is started on first use and belongs to the process that started it; a forked web
+    worker starts its own. Workers are spawned rather than forked so they do not inherit the web
+    server's threads, sockets or database clients.
+
+    Args:
+        max_workers (int): Number of rendering processes (defaults to the number of cores).
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._pool = None
+        self._pool_pid = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """Return this process's pool, starting it if needed."""
+        with self._lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=get_context("spawn"))
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def render_many(self, specs) -> list:
+        """
+        Render a batch of charts in parallel and wait for all of them.
+
+        Args:
+            specs (list): ChartSpec objects.
+
+        Returns:
+            list: The PNG bytes of each chart, in the order of `specs`.
+        """
+        if not specs:
+            return []
+        if len(specs) == 1 or self.max_workers == 1:
+            # Not worth a round trip to the pool
+            return [render_chart(spec) for spec in specs]
+
+        pool = self._get_pool()
+        futures = [pool.submit(render_chart, spec) for spec in specs]
+        return [future.result() for future in futures]
+
+    def shutdown(self) -> None:
+        """Stop the worker processes, if this process started any."""
+        with self._lock:
+            if self._pool is not None and self._pool_pid == os.getpid():
+                self._pool.shutdown()
+            self._pool = None
+            self._pool_pid = None
@@ -0,0 +1,400 @@
+"""
+Chart Rendering
+
+Rendering functions for every chart shown on the analytics pages. Each
+function takes plain counts and returns the PNG bytes, so the routes only
+decide what to draw and the chart cache decides whether it needs drawing at
+all and keeps the result in memory.
+
+Charts are drawn on their own `matplotlib.figure.Figure` objects and never
+touch pyplot's global current-figure state, so any number of threads can
+render at once.
+
+Charts of one kind share their layout (axes, labels, legend) and differ only
+in their numbers and titles, so each layout is built once as a figure
+template and reused: a render only moves bar heights, wedge angles and text
+before writing the image. A template serves one render at a time, so a
+process keeps as many per layout as it has had concurrent renders. Set
+CHART_TEMPLATES=0 to build a new figure for every chart instead.
+
+The `*_grid` functions draw a whole analytics page as one multi-panel figure,
+for the `?mode=grid` view, from the same layouts as the individual charts.
+"""
+
+import io
+import math
+import os
+import threading
+from contextlib import contextmanager
+
+STAR_LABELS = ["1 Star", "2 Star", "3 Star", "4 Star", "5 Star"]
+
+# Reuse pre-built figure templates (set CHART_TEMPLATES=0 to build every figure from scratch)
+TEMPLATES_ENABLED = os.getenv("CHART_TEMPLATES", "1").lower() not in ("0", "false", "no")
+
+_idle_templates = {}  # template key -> templates not currently in use
+_templates_lock = threading.Lock()
+
+
+def _new_figure(**kwargs):
+    """Create a standalone figure, importing matplotlib on first use to keep app start-up light."""
+    from matplotlib.figure import Figure
+
+    return Figure(**kwargs)
+
+
+@contextmanager
+def _template(key, build):
+    """
+    Check out an idle figure template for `key`, building one if none is free.
+
+    Args:
+        key (tuple): Identifies the layout, e.g. ("plot_pie",).
+        build (callable): Builds a new template, a dict holding at least "fig" and "ax".
+
+    Yields:
+        dict: The template. It goes back to the pool only if the render succeeds.
+    """
+    if not TEMPLATES_ENABLED:
+        yield build()
+        return
+
+    with _templates_lock:
+        idle = _idle_templates.get(key)
+        template = idle.pop() if idle else None
+    if template is None:
+        template = build()
+    yield template
+    with _templates_lock:
+        _idle_templates.setdefault(key, []).append(template)
+
+
+def _to_png(fig, **savefig_kwargs) -> bytes:
+    """Render a figure into an in-memory buffer and return the PNG bytes."""
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", **savefig_kwargs)
+    return buffer.getvalue()
+
+
+def _set_bar_heights(ax, bars, heights, bottoms=None) -> None:
+    """Update bar heights (and bottoms) and recompute the axis limits as a fresh chart would."""
+    for i, (bar, height) in enumerate(zip(bars, heights)):
+        if bottoms is not None:
+            bar.set_y(bottoms[i])
+            bar.sticky_edges.y[:] = [bottoms[i]]  # Autoscaling never pads past a bar's base
+        bar.set_height(height)
+    ax.relim()
+    ax.autoscale_view()
+
+
+def _set_bar_labels(texts, xs, ys, values) -> None:
+    """Move the count label of each bar to its new top and update its text."""
+    for text, x, y, value in zip(texts, xs, ys, values):
+        text.set_position((x, y))
+        text.set_text(str(value))
+
+
+def _set_wedges(wedges, sizes, startangle=90) -> None:
+    """Set the angles of pie wedges exactly as `Axes.pie` computes them."""
+    import numpy as np
+
+    fracs = np.asarray(sizes, np.float32)
+    if fracs.sum() > 0:
+        fracs = fracs / fracs.sum()  # An empty pie keeps every wedge at zero width
+    theta1 = startangle / 360
+    for wedge, frac in zip(wedges, fracs):
+        theta2 = theta1 + frac
+        wedge.set_theta1(360.0 * min(theta1, theta2))
+        wedge.set_theta2(360.0 * max(theta1, theta2))
+        theta1 = theta2
+
+
+def _figure_axes(ax=None, **figure_kwargs) -> tuple:
+    """Return `ax` and its figure, or a new figure with a single axes if `ax` is None."""
+    if ax is not None:
+        return ax.figure, ax
+    fig = _new_figure(**figure_kwargs)
+    return fig, fig.subplots()
+
+
+def _build_bar_graph_rating(ax=None) -> dict:
+    """Build the rating bar graph layout (on `ax`, or on a figure of its own), without data."""
+    fig, ax = _figure_axes(ax)
+    bars = ax.bar(STAR_LABELS, [0] * len(STAR_LABELS))
+    texts = [ax.text(i, 0, "", ha="center", va="bottom") for i in range(len(STAR_LABELS))]
+    ax.set_xlabel("Rating")
+    ax.set_ylabel("Number of Patients")
+    return {"fig": fig, "ax": ax, "bars": bars, "texts": texts}
+
+
+def bar_graph_rating(col_name, counts) -> bytes:
+    """
+    Render the bar graph of star ratings for one rating column.
+
+    Args:
+        col_name (str): The rating column, used as the title.
+        counts (list): Counts of 1..5 star ratings.
+
+    Returns:
+        bytes: The PNG image.
+    """
+    with _template(("bar_graph_rating",), _build_bar_graph_rating) as t:
+        _draw_bar_graph_rating(t, col_name, counts)
+        return _to_png(t["fig"])
+
+
+def _draw_bar_graph_rating(t, col_name, counts) -> None:
+    """Fill a rating bar graph layout with one column's counts."""
+    _set_bar_heights(t["ax"], t["bars"], counts)
+    _set_bar_labels(t["texts"], range(len(counts)), counts, counts)
+    t["ax"].set_title(col_name)
+
+
+def _build_bar_graph_yes_no(questions, ax=None) -> dict:
+    """Build the stacked yes/no bar graph layout for the given questions, without data."""
+    fig, ax = _figure_axes(ax, figsize=(15, 8))
+    x_indices = range(len(questions))
+    zeros = [0] * len(questions)
+    yes_bars = ax.bar(x_indices, zeros, label="Yes")
+    no_bars = ax.bar(x_indices, zeros, bottom=zeros, label="No")
+    yes_texts = [ax.text(i, 0, "", ha="center", va="bottom") for i in x_indices]
+    no_texts = [ax.text(i, 0, "", ha="center", va="bottom") for i in x_indices]
+    ax.set_title("Responses to Yes/No Questions")
+    ax.set_xlabel("Question")
+    ax.set_ylabel("Count")
+    ax.set_xticks(x_indices, questions)
+    ax.legend()
+    return {
+        "fig": fig,
+        "ax": ax,
+        "yes_bars": yes_bars,
+        "no_bars": no_bars,
+        "yes_texts": yes_texts,
+        "no_texts": no_texts,
+    }
+
+
+def bar_graph_yes_no(questions, counts_yes, counts_no) -> bytes:
+    """
+    Render the stacked bar graph of yes/no answers for every yes/no question.
+
+    Args:
+        questions (list): The yes/no columns, used as tick labels.
+        counts_yes (list): "yes" count per question.
+        counts_no (list): "no" count per question.
+
+    Returns:
+        bytes: The PNG image.
+    """
+    questions = list(questions)
+    with _template(("bar_graph_yes_no", *questions), lambda: _build_bar_graph_yes_no(questions)) as t:
+        _draw_bar_graph_yes_no(t, counts_yes, counts_no)
+        return _to_png(t["fig"], dpi=100, bbox_inches="tight")
+
+
+def _draw_bar_graph_yes_no(t, counts_yes, counts_no) -> None:
+    """Fill a stacked yes/no bar graph layout with the yes and no counts."""
+    x_indices = range(len(counts_yes))
+    no_tops = [count_no + count_yes for count_yes, count_no in zip(counts_yes, counts_no)]
+    _set_bar_heights(t["ax"], t["yes_bars"], counts_yes)
+    _set_bar_heights(t["ax"], t["no_bars"], counts_no, bottoms=counts_yes)
+    _set_bar_labels(t["yes_texts"], x_indices, counts_yes, counts_yes)
+    _set_bar_labels(t["no_texts"], x_indices, no_tops, counts_no)
+
+
+def _build_pie(n_wedges, legend_title=None, ax=None) -> dict:
+    """Build a pie chart layout with `n_wedges` wedges and a legend, without data."""
+    fig, ax = _figure_axes(ax)
+    wedges, _ = ax.pie([1] * n_wedges, startangle=90)
+    ax.axis("equal")
+    legend = ax.legend(wedges, [""] * n_wedges, title=legend_title)
+    return {"fig": fig, "ax": ax, "wedges": wedges, "legend": legend}
+
+
+def _update_pie(t, sizes, title, legend_labels) -> None:
+    """Fill a pie chart template with this render's sizes, title and legend labels."""
+    _set_wedges(t["wedges"], sizes)
+    # axis("equal") scales the view to the wedges, so rescale it as a fresh pie chart would be
+    t["ax"].relim()
+    t["ax"].autoscale_view()
+    t["ax"].set_title(title)
+    for text, label in zip(t["legend"].get_texts(), legend_labels):
+        text.set_text(label)
+
+
+def piechart_rating(col_name, sizes) -> bytes:
+    """
+    Render the pie chart of star ratings for one rating column.
+
+    Args:
+        col_name (str): The rating column, used in the title.
+        sizes (list): Counts of 1..5 star ratings.
+
+    Returns:
+        bytes: The PNG image.
+    """
+    with _template(("piechart_rating",), lambda: _build_pie(len(STAR_LABELS), "Star Ratings")) as t:
+        _draw_piechart_rating(t, col_name, sizes)
+        return _to_png(t["fig"])
+
+
+def _draw_piechart_rating(t, col_name, sizes) -> None:
+    """Fill a star rating pie chart layout with one column's counts."""
+    total = sum(sizes)
+    percentages = [f"{size} ({size / total * 100:.1f}%)" if total > 0 else "0" for size in sizes]
+    legend_labels = [f"{label}\n{perc}" for label, perc in zip(STAR_LABELS, percentages)]
+    _update_pie(t, sizes, f"{col_name} Rating", legend_labels)
+
+
+def plot_pie(question, yes_count, no_count) -> bytes:
+    """
+    Render the yes/no pie chart for one yes/no question.
+
+    Args:
+        question (str): The yes/no column, used as the title.
+        yes_count (int): Number of "yes" answers.
+        no_count (int): Number of "no" answers.
+
+    Returns:
+        bytes: The PNG image.
+    """
+    with _template(("plot_pie",), lambda: _build_pie(2)) as t:
+        _draw_plot_pie(t, question, yes_count, no_count)
+        return _to_png(t["fig"])
+
+
+def _draw_plot_pie(t, question, yes_count, no_count) -> None:
+    """Fill a yes/no pie chart layout with one question's counts."""
+    total_count = yes_count + no_count if (yes_count + no_count) > 0 else 1
+    labels = ["Yes", "No"]
+    values = [yes_count, no_count]
+    percentages = [f"{count} ({count / total_count * 100:.1f}%)" for count in values]
+    legend_labels = [f"{label}\n{perc}" for label, perc in zip(labels, percentages)]
+    _update_pie(t, values, question, legend_labels)
+
+
+def _build_ranking_bar_graph(n_bars, ax=None) -> dict:
+    """Build the ranking bar graph layout for `n_bars` columns, without data."""
+    fig, ax = _figure_axes(ax, figsize=(10, 6))
+    bars = ax.bar(range(n_bars), [0] * n_bars)
+    ax.set_xlabel("Column")
+    ax.set_ylabel("Count")
+    texts = [ax.text(0, 0, "", ha="center", va="bottom") for _ in range(n_bars)]
+    return {"fig": fig, "ax": ax, "bars": bars, "texts": texts}
+
+
+def ranking_bar_graph(title, labels, counts) -> bytes:
+    """
+    Render a bar graph of counts per column, as used on the overall analysis page.
+
+    Args:
+        title (str): The chart title.
+        labels (list): Column labels, already sorted.
+        counts (list): Count per label.
+
+    Returns:
+        bytes: The PNG image.
+    """
+    from matplotlib import rcParams
+
+    with _template(("ranking_bar_graph", len(counts)), lambda: _build_ranking_bar_graph(len(counts))) as t:
+        fig, texts = t["fig"], t["texts"]
+        _draw_ranking_bar_graph(t, title, labels, counts)
+
+        # The margins depend on this render's tick labels, so lay the figure out again from the
+        # default subplot positions, leaving the count labels out as a freshly drawn chart does
+        for text in texts:
+            text.set_visible(False)
+        fig.subplots_adjust(**{side: rcParams[f"figure.subplot.{side}"] for side in ("left", "bottom", "right", "top")})
+        fig.tight_layout()
+        for text in texts:
+            text.set_visible(True)
+        return _to_png(fig)
+
+
+def _draw_ranking_bar_graph(t, title, labels, counts) -> None:
+    """Fill a ranking bar graph layout with the sorted labels and their counts."""
+    ax, bars = t["ax"], t["bars"]
+    _set_bar_heights(ax, bars, counts)
+    ax.set_title(title)
+    ax.set_xticks(range(len(counts)), labels, rotation="vertical")
+    xs = [bar.get_x() + bar.get_width() / 2 for bar in bars]
+    _set_bar_labels(t["texts"], xs, counts, [int(count) for count in counts])
+
+
+# ----------------------------
+# Composite page charts
+# ----------------------------
+def _grid_axes(fig, gridspec, n_panels, n_cols, first_row=0) -> list:
+    """Add `n_panels` axes to `gridspec`, filling `n_cols` columns per row from `first_row` down."""
+    return [fig.add_subplot(gridspec[first_row + i // n_cols, i % n_cols]) for i in range(n_panels)]
+
+
+def bargraph_grid(ratings, questions, counts_yes, counts_no) -> bytes:
+    """
+    Render the bar graph page as one image: a grid of rating bar graphs, three per row,
+    above the stacked yes/no bar graph.
+
+    Args:
+        ratings (list): (col_name, counts) per rating column.
+        questions (list): The yes/no columns, used as tick labels.
+        counts_yes (list): "yes" count per question.
+        counts_no (list): "no" count per question.
+
+    Returns:
+        bytes: The PNG image.
+    """
+    rows = math.ceil(len(ratings) / 3)
+    fig = _new_figure(figsize=(18, 5 * rows + 7))
+    gridspec = fig.add_gridspec(rows + 1, 3, height_ratios=[1] * rows + [1.4])
+    for ax, (col_name, counts) in zip(_grid_axes(fig, gridspec, len(ratings), 3), ratings):
+        _draw_bar_graph_rating(_build_bar_graph_rating(ax), col_name, counts)
+    yes_no = _build_bar_graph_yes_no(list(questions), fig.add_subplot(gridspec[rows, :]))
+    _draw_bar_graph_yes_no(yes_no, counts_yes, counts_no)
+    fig.tight_layout()
+    return _to_png(fig)
+
+
+def piechart_grid(ratings, yes_no) -> bytes:
+    """
+    Render the pie chart page as one image: a grid of star rating pies, three per row,
+    followed by the yes/no pies, five per row.
+
+    Args:
+        ratings (list): (col_name, sizes) per rating column.
+        yes_no (list): (question, yes_count, no_count) per yes/no question.
+
+    Returns:
+        bytes: The PNG image.
+    """
+    rating_rows, yes_no_rows = math.ceil(len(ratings) / 3), math.ceil(len(yes_no) / 5)
+    fig = _new_figure(figsize=(20, 6 * rating_rows + 4.5 * yes_no_rows))
+    # 15 columns, so rating pies span 5 and yes/no pies span 3
+    gridspec = fig.add_gridspec(rating_rows + yes_no_rows, 15, height_ratios=[4] * rating_rows + [3] * yes_no_rows)
+    for i, (col_name, sizes) in enumerate(ratings):
+        ax = fig.add_subplot(gridspec[i // 3, (i % 3) * 5 : (i % 3 + 1) * 5])
+        _draw_piechart_rating(_build_pie(len(STAR_LABELS), "Star Ratings", ax), col_name, sizes)
+    for i, (question, yes_count, no_count) in enumerate(yes_no):
+        ax = fig.add_subplot(gridspec[rating_rows + i // 5, (i % 5) * 3 : (i % 5 + 1) * 3])
+        _draw_plot_pie(_build_pie(2, ax=ax), question, yes_count, no_count)
+    fig.tight_layout()
+    return _to_png(fig)
+
+
+def ranking_grid(rankings) -> bytes:
+    """
+    Render the overall analysis page as one image: every ranking bar graph, two per row.
+
+    Args:
+        rankings (list): (title, labels, counts) per ranking.
+
+    Returns:
+        bytes: The PNG image.
+    """
+    rows = math.ceil(len(rankings) / 2)
+    fig = _new_figure(figsize=(20, 6 * rows))
+    gridspec = fig.add_gridspec(rows, 2)
+    for ax, (title, labels, counts) in zip(_grid_axes(fig, gridspec, len(rankings), 2), rankings):
+        _draw_ranking_bar_graph(_build_ranking_bar_graph(len(counts), ax), title, labels, counts)
+    fig.tight_layout()
+    return _to_png(fig)
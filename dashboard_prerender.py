@@ -0,0 +1,383 @@
+"""
+Background Dashboard Pre-Rendering
+
+Without it, the first request after a write pays for reading the counts and
+rendering every chart of the page. With DASHBOARD_PRERENDER set, a scheduler
+rebuilds every dashboard artifact in the background instead: after
+DASHBOARD_PRERENDER_WRITES new writes or DASHBOARD_PRERENDER_SECONDS seconds
+(whichever comes first) it loads the counts, renders each page's PNG charts
+and composite grid into the chart cache and publishes the counts it drew
+from as a snapshot in Redis. The chart routes then read the snapshot instead
+of the live counters, so their charts are always already in the cache and a
+page costs the same however large the collection grows.
+
+DASHBOARD_PRERENDER=thread runs the scheduler inside each app process.
+DASHBOARD_PRERENDER=worker only reads snapshots; run the scheduler as its own
+process (with CHART_CACHE_BACKEND=redis so the app can serve its charts):
+
+    python dashboard_prerender.py
+"""
+
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+import redis
+
+import svg_charts
+from chart_executor import ChartSpec
+from feedback_stats import (
+    RATING_COLS,
+    YES_NO_COLS,
+    FeedbackStats,
+    aggregate_feedback_stats,
+    aggregate_feedback_stats_async,
+    load_feedback_stats,
+    load_feedback_stats_async,
+    read_data_version,
+    read_data_version_async,
+)
+
+# "thread" runs the scheduler in the app process, "worker" expects `python dashboard_prerender.py`
+PRERENDER_MODE = os.getenv("DASHBOARD_PRERENDER", "off").lower()
+PRERENDER_ENABLED = PRERENDER_MODE in ("thread", "worker")
+
+# Rebuild after this many writes, or this many seconds after the first unbuilt write
+PRERENDER_WRITES = int(os.getenv("DASHBOARD_PRERENDER_WRITES", 100))
+PRERENDER_SECONDS = float(os.getenv("DASHBOARD_PRERENDER_SECONDS", 30))
+
+SNAPSHOT_KEY = "dashboard:snapshot"
+
+
+# ----------------------------
+# Page Chart Specs
+# ----------------------------
+def bargraph_specs(stats) -> list:
+    """Describe a bar graph for each rating column, then a stacked bar graph for yes/no responses."""
+    specs = [ChartSpec("bar_graph_rating", (col, stats.ratings[col])) for col in RATING_COLS]
+    specs.append(ChartSpec("bar_graph_yes_no", (YES_NO_COLS, stats.answer_counts("yes"), stats.answer_counts("no"))))
+    return specs
+
+
+def bargraph_grid_spec(specs) -> ChartSpec:
+    """Describe the composite of every rating bar graph above the yes/no bar graph."""
+    return ChartSpec("bargraph_grid", ([spec.data for spec in specs[:-1]], *specs[-1].data))
+
+
+def piechart_specs(stats) -> list:
+    """Describe a pie chart for each rating column, then one for each yes/no question."""
+    specs = [ChartSpec("piechart_rating", (col, stats.ratings[col])) for col in RATING_COLS]
+    for question in YES_NO_COLS:
+        yes_count, no_count = stats.yes_no[question]
+        specs.append(ChartSpec("plot_pie", (question, yes_count, no_count)))
+    return specs
+
+
+def piechart_grid_spec(specs) -> ChartSpec:
+    """Describe the composite of every rating pie and yes/no pie."""
+    rating_data = [spec.data for spec in specs[: len(RATING_COLS)]]
+    yes_no_data = [spec.data for spec in specs[len(RATING_COLS) :]]
+    return ChartSpec("piechart_grid", (rating_data, yes_no_data))
+
+
+def ranking_specs(stats) -> list:
+    """Describe a bar graph ranking the columns for each star rating, then for yes and no responses."""
+    return [
+        ChartSpec("ranking_bar_graph", (ranking["title"], ranking["labels"], ranking["counts"]))
+        for ranking in stats.rankings()
+    ]
+
+
+def ranking_grid_spec(specs) -> ChartSpec:
+    """Describe the composite of every ranking."""
+    return ChartSpec("ranking_grid", ([spec.data for spec in specs],))
+
+
+# Page -> (its chart specs, its composite grid spec)
+PAGES = {
+    "bargraphs": (bargraph_specs, bargraph_grid_spec),
+    "piecharts": (piechart_specs, piechart_grid_spec),
+    "overall_bargraphs": (ranking_specs, ranking_grid_spec),
+}
+
+
+# ----------------------------
+# Snapshots
+# ----------------------------
+@dataclass
+class DashboardSnapshot:
+    """
+    The counts the latest pre-rendered charts were drawn from.
+
+    Attributes:
+        version (int): Data version the counts were read at.
+        modified (int): Unix time of the last write included.
+        stats (FeedbackStats): The counts.
+    """
+
+    version: int
+    modified: int
+    stats: FeedbackStats
+
+
+def _snapshot_from_reply(reply):
+    """Parse the JSON stored under SNAPSHOT_KEY, or return None if there is no snapshot yet."""
+    if reply is None:
+        return None
+    data = json.loads(reply)
+    stats = FeedbackStats(
+        ratings={col: list(data["ratings"][col]) for col in RATING_COLS},
+        yes_no={col: tuple(data["yes_no"][col]) for col in YES_NO_COLS},
+    )
+    return DashboardSnapshot(version=data["version"], modified=data["modified"], stats=stats)
+
+
+def publish_snapshot(redis_client, snapshot) -> None:
+    """
+    Store a snapshot unless a newer one has been published meanwhile (e.g. by another app process).
+
+    Args:
+        redis_client: The Redis client.
+        snapshot (DashboardSnapshot): The counts the charts were just rendered from.
+    """
+    payload = json.dumps(
+        {
+            "version": snapshot.version,
+            "modified": snapshot.modified,
+            "ratings": {col: list(snapshot.stats.ratings[col]) for col in RATING_COLS},
+            "yes_no": {col: list(snapshot.stats.yes_no[col]) for col in YES_NO_COLS},
+        }
+    )
+
+    def replace_if_newer(pipe):
+        current = _snapshot_from_reply(pipe.get(SNAPSHOT_KEY))
+        if current is not None and current.version > snapshot.version:
+            return
+        pipe.multi()
+        pipe.set(SNAPSHOT_KEY, payload)
+
+    redis_client.transaction(replace_if_newer, SNAPSHOT_KEY)
+
+
+def read_snapshot(redis_client):
+    """
+    Read the latest published snapshot.
+
+    Returns:
+        DashboardSnapshot | None: The snapshot, or None if none has been published yet.
+    """
+    return _snapshot_from_reply(redis_client.get(SNAPSHOT_KEY))
+
+
+async def read_snapshot_async(redis_client):
+    """Async variant of `read_snapshot` for an asyncio Redis client."""
+    return _snapshot_from_reply(await redis_client.get(SNAPSHOT_KEY))
+
+
+def load_dashboard_stats(collection, redis_client, match=None) -> FeedbackStats:
+    """
+    Return the counts the chart routes draw from: the latest snapshot when pre-rendering is on
+    (so every chart is already cached), otherwise (or until the first snapshot) the live counts.
+    Filtered counts (`match`, see `feedback_records.build_feedback_filter`) are aggregated in MongoDB.
+    """
+    if match:
+        return aggregate_feedback_stats(collection, match)
+    if PRERENDER_ENABLED:
+        snapshot = read_snapshot(redis_client)
+        if snapshot is not None:
+            return snapshot.stats
+    return load_feedback_stats(collection, redis_client)
+
+
+async def load_dashboard_stats_async(collection, redis_client, match=None) -> FeedbackStats:
+    """Async variant of `load_dashboard_stats` for a Motor collection and an asyncio Redis client."""
+    if match:
+        return await aggregate_feedback_stats_async(collection, match)
+    if PRERENDER_ENABLED:
+        snapshot = await read_snapshot_async(redis_client)
+        if snapshot is not None:
+            return snapshot.stats
+    return await load_feedback_stats_async(collection, redis_client)
+
+
+def read_dashboard_version(redis_client, match=None) -> tuple[int, int]:
+    """
+    Return the (version, modified) of the counts `load_dashboard_stats` serves, for HTTP validators,
+    so a page drawn from an older snapshot is never tagged with a newer version.
+    """
+    if PRERENDER_ENABLED and not match:
+        snapshot = read_snapshot(redis_client)
+        if snapshot is not None:
+            return snapshot.version, snapshot.modified
+    return read_data_version(redis_client)
+
+
+async def read_dashboard_version_async(redis_client, match=None) -> tuple[int, int]:
+    """Async variant of `read_dashboard_version` for an asyncio Redis client."""
+    if PRERENDER_ENABLED and not match:
+        snapshot = await read_snapshot_async(redis_client)
+        if snapshot is not None:
+            return snapshot.version, snapshot.modified
+    return await read_data_version_async(redis_client)
+
+
+# ----------------------------
+# Scheduler
+# ----------------------------
+class DashboardPrerenderer:
+    """
+    Rebuilds every dashboard artifact after `every_writes` writes or `every_seconds` seconds,
+    whichever comes first, by watching the data version bumped by every write path.
+
+    Args:
+        collection: The MongoDB Feedback collection.
+        redis_client: The Redis client.
+        chart_cache (ChartCache): Cache the charts are rendered into (the one the app serves from).
+        render_many (callable): Renders a batch of chart specs, e.g. `ChartExecutor.render_many`.
+        every_writes (int): Rebuild once this many writes have not been rendered yet.
+        every_seconds (float): Rebuild when any write has waited this long since the last rebuild.
+        poll_seconds (float): How often the data version is checked.
+    """
+
+    def __init__(
+        self,
+        collection,
+        redis_client,
+        chart_cache,
+        render_many,
+        every_writes=PRERENDER_WRITES,
+        every_seconds=PRERENDER_SECONDS,
+        poll_seconds=1.0,
+    ):
+        self.collection = collection
+        self.redis_client = redis_client
+        self.chart_cache = chart_cache
+        self.render_many = render_many
+        self.every_writes = every_writes
+        self.every_seconds = every_seconds
+        self.poll_seconds = poll_seconds
+        self.built_version = None
+        self.built_at = 0.0
+
+    def is_due(self, version) -> bool:
+        """Check whether the writes up to `version` call for a rebuild now."""
+        if self.built_version is None:
+            return True
+        pending = version - self.built_version
+        if pending >= self.every_writes:
+            return True
+        return pending > 0 and time.monotonic() - self.built_at >= self.every_seconds
+
+    def run_once(self) -> bool:
+        """
+        Check the data version and rebuild if due.
+
+        Returns:
+            bool: Whether the artifacts were rebuilt.
+        """
+        version, _ = read_data_version(self.redis_client)
+        if not self.is_due(version):
+            return False
+        self.rebuild()
+        return True
+
+    def rebuild(self) -> DashboardSnapshot:
+        """
+        Render every page's charts from the current counts and publish the counts as the snapshot.
+
+        Returns:
+            DashboardSnapshot: The published snapshot.
+        """
+        # Read the version first: writes landing in between only make the counts newer than it,
+        # and the next check rebuilds for them
+        version, modified = read_data_version(self.redis_client)
+        stats = load_feedback_stats(self.collection, self.redis_client)
+
+        specs = []
+        for page_specs, grid_spec in PAGES.values():
+            page = page_specs(stats)
+            if not svg_charts.SVG_ENABLED:
+                specs += page  # SVG charts are written into the page as it is served
+            specs.append(grid_spec(page))
+        self.chart_cache.get_or_render_many(specs, self.render_many)
+
+        snapshot = DashboardSnapshot(version=version, modified=modified, stats=stats)
+        publish_snapshot(self.redis_client, snapshot)
+        self.built_version = version
+        self.built_at = time.monotonic()
+        return snapshot
+
+    def run_forever(self, stop_event=None) -> None:
+        """
+        Rebuild whenever due until `stop_event` (a threading.Event) is set.
+
+        Args:
+            stop_event: Optional event used to stop the loop.
+        """
+        stop_event = stop_event or threading.Event()
+        while not stop_event.is_set():
+            try:
+                self.run_once()
+            except redis.exceptions.ConnectionError as e:
+                print(f"Dashboard pre-renderer lost its Redis connection: {e}")
+            except Exception as e:
+                # The routes keep serving the last snapshot (or live counts); retry later
+                print(f"Dashboard pre-rendering failed: {e}")
+                stop_event.wait(self.every_seconds)
+            stop_event.wait(self.poll_seconds)
+
+
+def start_prerender_thread(get_clients, chart_cache, render_many) -> tuple:
+    """
+    Run a DashboardPrerenderer in a daemon thread of this process.
+
+    Args:
+        get_clients (callable): Returns (collection, redis_client); called in the thread, so the
+            app does not connect at import time.
+        chart_cache (ChartCache): The app's chart cache.
+        render_many (callable): Renders a batch of chart specs.
+
+    Returns:
+        tuple: (thread, stop_event); set the event to stop the thread.
+    """
+    stop_event = threading.Event()
+
+    def run():
+        # Connect inside the thread's retry loop: if MongoDB or Redis is unreachable when the thread
+        # starts, it retries every PRERENDER_SECONDS instead of dying
+        while not stop_event.is_set():
+            try:
+                collection, redis_client = get_clients()
+            except Exception as e:
+                print(f"Dashboard pre-renderer could not connect, will retry: {e}")
+                stop_event.wait(PRERENDER_SECONDS)
+                continue
+            DashboardPrerenderer(collection, redis_client, chart_cache, render_many).run_forever(stop_event)
+
+    thread = threading.Thread(target=run, name="dashboard-prerender", daemon=True)
+    thread.start()
+    return thread, stop_event
+
+
+if __name__ == "__main__":
+    from chart_cache import ChartCache
+    from chart_executor import ChartExecutor
+    from db_clients import get_mongo_client, get_redis_client
+
+    # Charts go through Redis, where the app's cache (CHART_CACHE_BACKEND=redis) finds them
+    chart_cache = ChartCache(
+        max_entries=int(os.getenv("CHART_CACHE_SIZE", 256)),
+        get_redis=get_redis_client,
+        ttl=int(os.getenv("CHART_CACHE_TTL", 3600)),
+    )
+    chart_executor = ChartExecutor(max_workers=int(os.getenv("CHART_RENDER_WORKERS", 0)) or None)
+    prerenderer = DashboardPrerenderer(
+        get_mongo_client(ping=True)["Naseeb"]["Feedback"],
+        get_redis_client(ping=True),
+        chart_cache,
+        chart_executor.render_many,
+    )
+    print(f"Dashboard pre-renderer rebuilding every {PRERENDER_WRITES} writes or {PRERENDER_SECONDS:g} seconds")
+    prerenderer.run_forever()
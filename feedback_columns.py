@@ -0,0 +1,182 @@
+"""
+Columnar Feedback Statistics
+
+Loads every rating and yes/no field of the Feedback collection in one
+projected, batched cursor pass into compact NumPy arrays: an int8 matrix of
+star ratings (0 where a rating is missing) and boolean yes / no masks. Star
+distributions, means and totals are then computed for all columns at once
+with `np.bincount` and vector operations, so the only Python work per
+document is picking its fields out of the decoded batch.
+
+It is an alternative to the $group pipeline in feedback_stats for counting
+in the app instead of on the database server: set STATS_AGGREGATION=numpy.
+"""
+
+from dataclasses import dataclass
+from itertools import chain, islice
+from operator import itemgetter
+
+import numpy as np
+
+from feedback_stats import RATING_COLS, STAR_RATINGS, YES_NO_COLS, FeedbackStats
+
+# Only the chart fields are read from MongoDB
+COLUMN_PROJECTION = {"_id": 0, **{col: 1 for col in RATING_COLS + YES_NO_COLS}}
+
+_get_ratings = itemgetter(*RATING_COLS)
+_get_answers = itemgetter(*YES_NO_COLS)
+
+
+@dataclass
+class FeedbackColumns:
+    """
+    The chart fields of many feedback documents, one row per document.
+
+    Attributes:
+        ratings (np.ndarray): int8 array of shape (documents, len(RATING_COLS)), 0 for a missing rating.
+        yes (np.ndarray): bool array of shape (documents, len(YES_NO_COLS)), True where the answer is "yes".
+        no (np.ndarray): bool array of the same shape, True where the answer is "no".
+    """
+
+    ratings: np.ndarray
+    yes: np.ndarray
+    no: np.ndarray
+
+    def distributions(self) -> np.ndarray:
+        """
+        Count the 1..5 star ratings of every rating column in one `np.bincount`.
+
+        Returns:
+            np.ndarray: Shape (len(RATING_COLS), 5), the counts of 1..5 stars per column.
+        """
+        n_values = len(STAR_RATINGS) + 1  # 0 (missing) to 5
+        offsets = np.arange(len(RATING_COLS)) * n_values
+        counts = np.bincount((self.ratings + offsets).ravel(), minlength=len(RATING_COLS) * n_values)
+        return counts.reshape(len(RATING_COLS), n_values)[:, 1:]
+
+    def totals(self) -> np.ndarray:
+        """Return the number of ratings recorded per rating column."""
+        return np.count_nonzero(self.ratings, axis=0)
+
+    def means(self) -> np.ndarray:
+        """Return the mean star rating per rating column (NaN for a column without ratings)."""
+        totals = self.totals()
+        sums = self.ratings.sum(axis=0, dtype=np.int64)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return sums / totals
+
+    def to_stats(self) -> FeedbackStats:
+        """Convert the columns into the FeedbackStats the chart routes draw from."""
+        distributions = self.distributions().tolist()
+        yes_counts = np.count_nonzero(self.yes, axis=0).tolist()
+        no_counts = np.count_nonzero(self.no, axis=0).tolist()
+        return FeedbackStats(
+            ratings=dict(zip(RATING_COLS, distributions)),
+            yes_no={col: (yes, no) for col, yes, no in zip(YES_NO_COLS, yes_counts, no_counts)},
+        )
+
+
+def _star_rating(value) -> int:
+    """
+    Return `value` as a 1..5 star rating, or 0 if it is not one. Like the pipeline's $eq, a number
+    equal to a star counts (3 or 3.0) but a string ("3") or a boolean does not.
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and value in STAR_RATINGS:
+        return int(value)
+    return 0
+
+
+def _rating_array(docs) -> np.ndarray:
+    """Convert a batch's star ratings into an int8 array, with 0 for missing or invalid ratings."""
+    try:
+        rows = list(map(_get_ratings, docs))
+        # Only plain ints take the fast path: NumPy would also turn True into 1 and "3" into 3
+        if set(map(type, chain.from_iterable(rows))) <= {int}:
+            ratings = np.array(rows, dtype=np.int64).reshape(len(docs), len(RATING_COLS))
+            if ratings.size == 0 or (ratings.min() >= 1 and ratings.max() <= 5):
+                return ratings.astype(np.int8)
+    except KeyError:
+        pass
+    # Some document lacks a rating (or holds an invalid one): check the fields one by one
+    values = [[_star_rating(doc.get(col)) for col in RATING_COLS] for doc in docs]
+    return np.array(values, dtype=np.int8).reshape(len(docs), len(RATING_COLS))
+
+
+def _answer_arrays(docs) -> tuple:
+    """Convert a batch's yes/no answers into boolean yes and no masks."""
+    try:
+        rows = list(map(_get_answers, docs))
+    except KeyError:
+        rows = [[doc.get(col) for col in YES_NO_COLS] for doc in docs]
+    answers = np.array(rows, dtype=object).reshape(len(docs), len(YES_NO_COLS))
+    return answers == "yes", answers == "no"
+
+
+class _ColumnBuilder:
+    """Converts batches of documents to arrays and joins them into FeedbackColumns."""
+
+    def __init__(self):
+        self.ratings = []
+        self.yes = []
+        self.no = []
+
+    def add_batch(self, docs) -> None:
+        # Every per-document step (field lookup, conversion, comparison) runs in C
+        self.ratings.append(_rating_array(docs))
+        yes, no = _answer_arrays(docs)
+        self.yes.append(yes)
+        self.no.append(no)
+
+    def finish(self) -> FeedbackColumns:
+        if not self.ratings:
+            return FeedbackColumns(
+                ratings=np.zeros((0, len(RATING_COLS)), dtype=np.int8),
+                yes=np.zeros((0, len(YES_NO_COLS)), dtype=bool),
+                no=np.zeros((0, len(YES_NO_COLS)), dtype=bool),
+            )
+        return FeedbackColumns(
+            ratings=np.concatenate(self.ratings), yes=np.concatenate(self.yes), no=np.concatenate(self.no)
+        )
+
+
+def columns_from_documents(documents, batch_size=10000) -> FeedbackColumns:
+    """
+    Build FeedbackColumns from an iterable of documents, converting them a batch at a time.
+
+    Args:
+        documents (Iterable): Feedback documents (or dicts with at least the chart fields).
+        batch_size (int): Documents converted to arrays at once.
+
+    Returns:
+        FeedbackColumns: The chart fields of every document.
+    """
+    builder = _ColumnBuilder()
+    documents = iter(documents)
+    while batch := list(islice(documents, batch_size)):
+        builder.add_batch(batch)
+    return builder.finish()
+
+
+def load_feedback_columns(collection, match=None, batch_size=10000) -> FeedbackColumns:
+    """
+    Read the chart fields of the (optionally filtered) Feedback collection in one cursor pass.
+
+    Args:
+        collection: The MongoDB Feedback collection.
+        match (dict): Optional filter, e.g. from `feedback_records.build_feedback_filter`.
+        batch_size (int): Documents fetched per round trip and converted to arrays at once.
+
+    Returns:
+        FeedbackColumns: The chart fields of every matching document.
+    """
+    cursor = collection.find(match or {}, COLUMN_PROJECTION, batch_size=batch_size)
+    return columns_from_documents(cursor, batch_size)
+
+
+async def load_feedback_columns_async(collection, match=None, batch_size=10000) -> FeedbackColumns:
+    """Async variant of `load_feedback_columns` for a Motor collection."""
+    builder = _ColumnBuilder()
+    cursor = collection.find(match or {}, COLUMN_PROJECTION, batch_size=batch_size)
+    while batch := await cursor.to_list(length=batch_size):
+        builder.add_batch(batch)
+    return builder.finish()
@@ -0,0 +1,149 @@
+"""
+Feedback Record Validation
+
+Builds the feedback document stored in MongoDB and Redis from submitted
+fields. The feedback form, the bulk ingestion endpoint and the background
+writers all go through `build_feedback_record`, so every path stores the
+same fields with the same types.
+
+Records keep their `date` as an ISO string (they are also stored as JSON in
+Redis); `to_document` turns it into a BSON date for MongoDB, where the chart
+routes filter on it through an index, and adds the normalized name and email
+keys the manage search matches on (see feedback_search).
+"""
+
+from datetime import datetime, timedelta
+
+from pymongo import UpdateOne
+
+from feedback_search import search_keys
+from feedback_stats import RATING_COLS, STAR_RATINGS, YES_NO_ANSWERS, YES_NO_COLS
+
+# Every field of a feedback document, in the order the form collects them
+FEEDBACK_FIELDS = ["patient_id", "name", "age", "email", "date", *RATING_COLS, *YES_NO_COLS, "other_comments"]
+
+# Fields stored only when submitted
+OPTIONAL_FIELDS = ["department"]
+
+
+def parse_date(value, field="date") -> datetime:
+    """
+    Parse an ISO date ("2025-03-01") or date and time.
+
+    Raises:
+        ValueError: If `value` is not an ISO date.
+    """
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid value for {field}: {value!r}")
+
+
+def build_feedback_record(fields) -> dict:
+    """
+    Validate submitted fields and convert them into a feedback document.
+
+    Args:
+        fields (Mapping): Submitted values keyed by field name (form data, a JSON object or a CSV row).
+
+    Returns:
+        dict: The feedback document.
+
+    Raises:
+        ValueError: If a field is missing or has an invalid value.
+    """
+    missing = [field for field in FEEDBACK_FIELDS if fields.get(field) is None]
+    if missing:
+        raise ValueError(f"Missing field(s): {', '.join(missing)}")
+
+    feedback_data = {}
+    for field in FEEDBACK_FIELDS:
+        value = fields.get(field)
+        if field in ("patient_id", "age") or field in RATING_COLS:
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"Invalid value for {field}: {value!r}")
+        if field in RATING_COLS and value not in STAR_RATINGS:
+            raise ValueError(f"Invalid rating for {field}: {value!r}")
+        if field in YES_NO_COLS and value not in YES_NO_ANSWERS:
+            raise ValueError(f"Invalid answer for {field}: {value!r}")
+        if field == "date":
+            parse_date(value)
+        feedback_data[field] = value
+    for field in OPTIONAL_FIELDS:
+        if fields.get(field):
+            feedback_data[field] = fields.get(field)
+    return feedback_data
+
+
+def to_document(feedback_data) -> dict:
+    """
+    Return a copy of a feedback record to insert into MongoDB, with `date` as a BSON date and the
+    search keys of its name and email. Being a copy, the _id MongoDB generates is not added to the
+    record itself.
+    """
+    document = dict(feedback_data)
+    if isinstance(document.get("date"), str):
+        document["date"] = parse_date(document["date"])
+    document.update(search_keys(document))
+    return document
+
+
+def build_feedback_filter(params) -> dict:
+    """
+    Build the MongoDB filter for the optional chart filters.
+
+    Args:
+        params (Mapping): Query parameters; `from` and `to` are ISO dates (both days included) and
+            `department` an exact department name. Missing or empty parameters are ignored.
+
+    Returns:
+        dict: The filter, empty when no filter is given.
+
+    Raises:
+        ValueError: If a date is invalid.
+    """
+    match = {}
+    date_range = {}
+    if params.get("from"):
+        date_range["$gte"] = parse_date(params.get("from"), "from")
+    if params.get("to"):
+        date_range["$lt"] = parse_date(params.get("to"), "to") + timedelta(days=1)
+    if params.get("department"):
+        match["department"] = params.get("department")
+    if date_range:
+        match["date"] = date_range
+    return match
+
+
+def convert_string_dates(collection, batch_size=1000) -> int:
+    """
+    Convert the `date` of documents stored before dates were BSON dates, so date filters include them.
+
+    Args:
+        collection: The MongoDB Feedback collection.
+        batch_size (int): Updates sent per bulk_write round trip.
+
+    Returns:
+        int: The number of documents converted.
+    """
+    converted = 0
+    updates = []
+    for doc in collection.find({"date": {"$type": "string"}}, {"date": 1}):
+        try:
+            updates.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"date": parse_date(doc["date"])}}))
+        except ValueError:
+            print(f"Skipping document {doc['_id']} with unreadable date {doc['date']!r}")
+        if len(updates) == batch_size:
+            converted += collection.bulk_write(updates, ordered=False).modified_count
+            updates = []
+    if updates:
+        converted += collection.bulk_write(updates, ordered=False).modified_count
+    return converted
+
+
+if __name__ == "__main__":
+    from db_clients import get_feedback_collection
+
+    print(f"Converted the date of {convert_string_dates(get_feedback_collection())} documents")
@@ -0,0 +1,475 @@
+"""
+Feedback Search
+
+Builds the MongoDB query for the manage page's "show" search and reads its
+results one page at a time. Pages are keyset-paginated on the unique
+patient_id index: the next page is the first MANAGE_PAGE_SIZE matches with a
+patient_id above the last one shown (the previous page, below the first one),
+so every page costs one bounded index range read and holds at most one page
+of documents in memory, however many documents match.
+
+Names and emails are matched through normalized keys stored with every
+document (`search_keys`), never by an unanchored case-insensitive regex over
+`name`, which MongoDB can only answer by scanning the whole collection:
+
+- `email_key`: the lower-cased email, matched exactly through its index.
+- `name_key`: the lower-cased, accent-free name; a name shorter than
+  NGRAM_SIZE characters is matched as a prefix of it (an index range).
+- `name_grams`: the distinct trigrams of `name_key` in a multikey index. A
+  longer name must contain all of its trigrams, read from the index, and
+  only those candidates are checked for the exact substring. A name that
+  matches nothing is answered with the stored names sharing the most
+  trigrams with it (`suggest_names`), catching typos.
+
+Documents stored before these keys existed get them with
+`python feedback_search.py`.
+
+"Show all" instead streams every match: the template iterates a cursor that
+fetches MANAGE_STREAM_BATCH_SIZE documents per round trip, and the rendered
+HTML is sent in chunks of about MANAGE_STREAM_BUFFER_BYTES as it is produced.
+
+Listings read only the MANAGE_LIST_FIELDS columns of each match and hold them
+as plain tuples; the whole document of one patient is read on demand
+(`find_details`).
+"""
+
+import os
+import re
+import unicodedata
+from dataclasses import dataclass
+
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+
+# Form fields the search filters on
+SEARCH_FIELDS = ["patient_id", "name", "age", "email"]
+
+MANAGE_PAGE_SIZE = int(os.getenv("MANAGE_PAGE_SIZE", 50))
+MANAGE_STREAM_BATCH_SIZE = int(os.getenv("MANAGE_STREAM_BATCH_SIZE", 500))
+MANAGE_STREAM_BUFFER_BYTES = int(os.getenv("MANAGE_STREAM_BUFFER_BYTES", 16384))
+
+# Every field shown on the manage page, in display order, with its column heading
+FIELD_LABELS = {
+    "patient_id": "Patient ID",
+    "name": "Name",
+    "age": "Age",
+    "email": "Email",
+    "date": "Date",
+    "department": "Department",
+    "overall_exp": "Overall Experience",
+    "doc_care": "Doctor Care",
+    "doc_comm": "Doctor Communication",
+    "nurse_care": "Nurse Care",
+    "food_quality": "Food Quality",
+    "accommodation": "Accommodation",
+    "sanitization": "Sanitization",
+    "safety": "Safety",
+    "staff_support": "Staff Support",
+    "doc_involvement": "Doctor Involvement",
+    "nurse_promptness": "Nurse Promptness",
+    "cleanliness": "Cleanliness",
+    "timely_info": "Timely Information",
+    "med_info": "Medicine Information",
+    "other_comments": "Other Comments",
+}
+
+
+def listing_fields(names) -> list:
+    """
+    Validate the fields read per search result, with patient_id (which pages are keyed on) first.
+
+    Args:
+        names (Iterable[str]): Field names, e.g. from the comma-separated MANAGE_LIST_FIELDS.
+
+    Returns:
+        list: The fields, starting with patient_id.
+
+    Raises:
+        ValueError: If a name is not a field of FIELD_LABELS.
+    """
+    fields = ["patient_id"] + [name.strip() for name in names if name.strip() not in ("", "patient_id")]
+    unknown = [name for name in fields if name not in FIELD_LABELS]
+    if unknown:
+        raise ValueError(f"Unknown manage listing field(s): {', '.join(unknown)}")
+    return fields
+
+
+# Columns of the search result table; the rest of a document is shown by its details view
+MANAGE_LIST_FIELDS = listing_fields(os.getenv("MANAGE_LIST_FIELDS", "patient_id,name,age,email,date").split(","))
+MANAGE_LIST_COLUMNS = [(name, FIELD_LABELS[name]) for name in MANAGE_LIST_FIELDS]
+DETAIL_COLUMNS = list(FIELD_LABELS.items())
+
+# Length of the name n-grams stored in `name_grams`
+NGRAM_SIZE = 3
+# Share of a searched name's trigrams a stored name must have to be suggested
+SUGGEST_MIN_OVERLAP = 0.5
+
+
+# ----------------------------
+# Search keys
+# ----------------------------
+def normalize_search_text(value) -> str:
+    """
+    Normalize a name or email for matching: accents removed, case folded and whitespace collapsed.
+
+    Args:
+        value (str): The text as entered.
+
+    Returns:
+        str: The normalized text ("José  Alvarez" -> "jose alvarez").
+    """
+    decomposed = unicodedata.normalize("NFKD", str(value))
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(stripped.casefold().split())
+
+
+def ngrams(text, size=NGRAM_SIZE) -> list:
+    """Return the distinct `size`-character substrings of `text`, sorted."""
+    return sorted({text[i : i + size] for i in range(len(text) - size + 1)})
+
+
+def search_keys(record) -> dict:
+    """
+    Build the stored search fields of a feedback record.
+
+    Args:
+        record (Mapping): The record, with its `name` and `email`.
+
+    Returns:
+        dict: `name_key`, `name_grams` and `email_key`, to store alongside the record's fields.
+    """
+    name_key = normalize_search_text(record.get("name", ""))
+    return {
+        "name_key": name_key,
+        "name_grams": ngrams(name_key),
+        "email_key": normalize_search_text(record.get("email", "")),
+    }
+
+
+def name_query(name) -> dict:
+    """
+    Build the indexed query for documents whose name contains `name`, ignoring case and accents.
+
+    Args:
+        name (str): The name (or part of it) as entered.
+
+    Returns:
+        dict: The query on `name_key` / `name_grams`.
+    """
+    key = normalize_search_text(name)
+    if len(key) < NGRAM_SIZE:
+        # Too short to have a trigram: match the start of the name, an index range on name_key
+        return {"name_key": {"$regex": "^" + re.escape(key)}}
+    # The trigrams narrow the candidates through the index; the regex only checks those
+    return {"name_grams": {"$all": ngrams(key)}, "name_key": {"$regex": re.escape(key)}}
+
+
+def _suggest_pipeline(name, limit) -> list:
+    """Build the aggregation ranking stored names by the trigrams they share with `name`."""
+    grams = ngrams(normalize_search_text(name))
+    return [
+        {"$match": {"name_grams": {"$in": grams}}},
+        {
+            "$project": {
+                "_id": 0,
+                "name": 1,
+                "shared": {"$size": {"$filter": {"input": "$name_grams", "cond": {"$in": ["$$this", grams]}}}},
+            }
+        },
+        {"$match": {"shared": {"$gte": max(1, round(len(grams) * SUGGEST_MIN_OVERLAP))}}},
+        {"$group": {"_id": "$name", "shared": {"$max": "$shared"}}},
+        {"$sort": {"shared": DESCENDING, "_id": ASCENDING}},
+        {"$limit": limit},
+    ]
+
+
+def suggest_names(collection, name, limit=5) -> list:
+    """
+    Find stored names similar to `name` (e.g. misspelt), by the share of their trigrams in common.
+
+    Args:
+        collection: The MongoDB Feedback collection.
+        name (str): The name as entered.
+        limit (int): Maximum number of names returned.
+
+    Returns:
+        list: Distinct names, most similar first (empty for a name shorter than NGRAM_SIZE).
+    """
+    if len(normalize_search_text(name)) < NGRAM_SIZE:
+        return []
+    return [doc["_id"] for doc in collection.aggregate(_suggest_pipeline(name, limit))]
+
+
+async def suggest_names_async(collection, name, limit=5) -> list:
+    """Async variant of `suggest_names` for a Motor collection."""
+    if len(normalize_search_text(name)) < NGRAM_SIZE:
+        return []
+    docs = await collection.aggregate(_suggest_pipeline(name, limit)).to_list(length=limit)
+    return [doc["_id"] for doc in docs]
+
+
+def add_search_keys(collection, batch_size=1000) -> int:
+    """
+    Store the search keys of documents saved before they existed, so name and email searches find them.
+
+    Args:
+        collection: The MongoDB Feedback collection.
+        batch_size (int): Updates sent per bulk_write round trip.
+
+    Returns:
+        int: The number of documents updated.
+    """
+    updated = 0
+    updates = []
+    for doc in collection.find({"name_grams": {"$exists": False}}, {"name": 1, "email": 1}):
+        updates.append(UpdateOne({"_id": doc["_id"]}, {"$set": search_keys(doc)}))
+        if len(updates) == batch_size:
+            updated += collection.bulk_write(updates, ordered=False).modified_count
+            updates = []
+    if updates:
+        updated += collection.bulk_write(updates, ordered=False).modified_count
+    return updated
+
+
+# ----------------------------
+# Paged and streamed search
+# ----------------------------
+def build_search_query(form_data) -> dict:
+    """
+    Build the MongoDB query for the non-empty search fields of the manage form.
+
+    Args:
+        form_data (Mapping): The submitted form data.
+
+    Returns:
+        dict: The query.
+    """
+    query = {}
+    for field in SEARCH_FIELDS:
+        value = form_data.get(field)
+        if value:
+            if field in ["patient_id", "age"]:
+                query[field] = int(value)
+            elif field == "name":
+                query.update(name_query(value))
+            elif field == "email":
+                query["email_key"] = normalize_search_text(value)
+            else:
+                query[field] = value
+    return query
+
+
+@dataclass
+class SearchPage:
+    """
+    One page of search results.
+
+    Attributes:
+        entries (list): One tuple of listing fields per match on this page (patient_id first), in
+            patient_id order.
+        criteria (dict): The non-empty search fields, resubmitted by the next/previous links.
+        first_row (int): Row number of the first entry across all pages (1 on the first page).
+        page_size (int): Maximum number of entries per page.
+        next_after (int): patient_id to continue after for the next page, or None on the last page.
+        prev_before (int): patient_id to continue before for the previous page, or None on the first page.
+        suggestions (list): Similar stored names when a name search matched nothing.
+    """
+
+    entries: list
+    criteria: dict
+    first_row: int
+    page_size: int
+    next_after: int
+    prev_before: int
+    suggestions: list
+
+
+def _int_or_none(value):
+    """Parse an optional integer form field."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _page_request(form_data) -> tuple:
+    """
+    Work out which page the form asks for.
+
+    Returns:
+        tuple: (query, sort direction, after, before, first_row) where the query includes the
+        keyset bound on patient_id.
+    """
+    query = build_search_query(form_data)
+    after = _int_or_none(form_data.get("after"))
+    before = _int_or_none(form_data.get("before"))
+    first_row = max(_int_or_none(form_data.get("first_row")) or 1, 1)
+    if "patient_id" in query:
+        # At most one document matches, so there is nothing to page through
+        return query, ASCENDING, None, None, 1
+    if before is not None:
+        query["patient_id"] = {"$lt": before}
+        return query, DESCENDING, None, before, first_row
+    if after is not None:
+        query["patient_id"] = {"$gt": after}
+    return query, ASCENDING, after, None, first_row
+
+
+def _projection(fields) -> dict:
+    """Build the projection reading only `fields`."""
+    return {"_id": 0, **{name: 1 for name in fields}}
+
+
+def _to_row(doc, fields) -> tuple:
+    """Pick the listing fields of a projected document (None for a missing one)."""
+    return tuple(map(doc.get, fields))
+
+
+def _make_page(docs, form_data, fields, page_size, direction, after, before, first_row) -> SearchPage:
+    """Turn the up to `page_size + 1` documents read for a page into a SearchPage."""
+    has_more = len(docs) > page_size
+    rows = [_to_row(doc, fields) for doc in docs[:page_size]]
+    if direction == DESCENDING:
+        rows.reverse()
+    # Reading one document past the page tells whether there is another page in that direction
+    has_next = has_more if direction == ASCENDING else before is not None
+    has_prev = has_more if direction == DESCENDING else after is not None
+    return SearchPage(
+        entries=rows,
+        criteria={field: form_data.get(field) for field in SEARCH_FIELDS if form_data.get(field)},
+        first_row=first_row,
+        page_size=page_size,
+        next_after=rows[-1][0] if rows and has_next else None,
+        prev_before=rows[0][0] if rows and has_prev else None,
+        suggestions=[],
+    )
+
+
+def search_page(collection, form_data, page_size=MANAGE_PAGE_SIZE, fields=MANAGE_LIST_FIELDS) -> SearchPage:
+    """
+    Read one page of the documents matching the manage form's search fields.
+
+    Args:
+        collection: The MongoDB Feedback collection.
+        form_data (Mapping): The submitted form data: the search fields, plus `after` or `before`
+            (a patient_id) and `first_row` when following a next / previous link.
+        page_size (int): Maximum number of documents per page.
+        fields (list): The fields read per document, patient_id first (see `listing_fields`).
+
+    Returns:
+        SearchPage: The page.
+    """
+    query, direction, after, before, first_row = _page_request(form_data)
+    cursor = collection.find(query, _projection(fields)).sort("patient_id", direction).limit(page_size + 1)
+    page = _make_page(list(cursor), form_data, fields, page_size, direction, after, before, first_row)
+    if not page.entries and form_data.get("name"):
+        page.suggestions = suggest_names(collection, form_data.get("name"))
+    return page
+
+
+async def search_page_async(collection, form_data, page_size=MANAGE_PAGE_SIZE, fields=MANAGE_LIST_FIELDS) -> SearchPage:
+    """Async variant of `search_page` for a Motor collection."""
+    query, direction, after, before, first_row = _page_request(form_data)
+    cursor = collection.find(query, _projection(fields)).sort("patient_id", direction).limit(page_size + 1)
+    docs = await cursor.to_list(length=page_size + 1)
+    page = _make_page(docs, form_data, fields, page_size, direction, after, before, first_row)
+    if not page.entries and form_data.get("name"):
+        page.suggestions = await suggest_names_async(collection, form_data.get("name"))
+    return page
+
+
+def wants_all_rows(form_data) -> bool:
+    """Return whether the form asks for every match at once (the "Show all" button) rather than a page."""
+    return bool(form_data.get("all"))
+
+
+def _search_cursor(collection, form_data, fields, batch_size):
+    """Return a cursor over the listing fields of every match, in patient_id order."""
+    query = build_search_query(form_data)
+    return collection.find(query, _projection(fields)).sort("patient_id", ASCENDING).batch_size(batch_size)
+
+
+def search_rows(collection, form_data, fields=MANAGE_LIST_FIELDS, batch_size=MANAGE_STREAM_BATCH_SIZE):
+    """
+    Lazily yield every document matching the manage form's search fields, as listing rows.
+
+    Nothing is read until the rows are iterated, and then only `batch_size` documents are held at a
+    time.
+
+    Args:
+        collection: The MongoDB Feedback collection.
+        form_data (Mapping): The submitted form data.
+        fields (list): The fields read per document, patient_id first (see `listing_fields`).
+        batch_size (int): Documents fetched per round trip.
+
+    Yields:
+        tuple: The listing fields of each match, in patient_id order.
+    """
+    for doc in _search_cursor(collection, form_data, fields, batch_size):
+        yield _to_row(doc, fields)
+
+
+async def search_rows_async(collection, form_data, fields=MANAGE_LIST_FIELDS, batch_size=MANAGE_STREAM_BATCH_SIZE):
+    """Async variant of `search_rows` for a Motor collection."""
+    async for doc in _search_cursor(collection, form_data, fields, batch_size):
+        yield _to_row(doc, fields)
+
+
+def find_details(collection, patient_id):
+    """
+    Read every shown field of one patient's feedback, for the details view of a listing row.
+
+    Args:
+        collection: The MongoDB Feedback collection.
+        patient_id (int): The patient ID.
+
+    Returns:
+        dict: The document without its _id and search keys, or None if there is none.
+    """
+    return collection.find_one({"patient_id": patient_id}, _projection(FIELD_LABELS))
+
+
+async def find_details_async(collection, patient_id):
+    """Async variant of `find_details` for a Motor collection."""
+    return await collection.find_one({"patient_id": patient_id}, _projection(FIELD_LABELS))
+
+
+def buffer_chunks(chunks, size=MANAGE_STREAM_BUFFER_BYTES):
+    """
+    Join the many small strings a streamed template yields into chunks of about `size` characters,
+    so the response is written in a few large writes instead of one per template fragment.
+
+    Args:
+        chunks (Iterable[str]): The rendered fragments.
+        size (int): Characters to collect before yielding.
+
+    Yields:
+        str: The joined fragments.
+    """
+    buffer, buffered = [], 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        buffered += len(chunk)
+        if buffered >= size:
+            yield "".join(buffer)
+            buffer, buffered = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+
+async def buffer_chunks_async(chunks, size=MANAGE_STREAM_BUFFER_BYTES):
+    """Async variant of `buffer_chunks` for a template rendered with `generate_async`."""
+    buffer, buffered = [], 0
+    async for chunk in chunks:
+        buffer.append(chunk)
+        buffered += len(chunk)
+        if buffered >= size:
+            yield "".join(buffer)
+            buffer, buffered = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+
+if __name__ == "__main__":
+    from db_clients import get_feedback_collection
+
+    print(f"Added search keys to {add_search_keys(get_feedback_collection())} documents")
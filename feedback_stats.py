@@ -0,0 +1,528 @@
+"""
+Feedback Statistics Aggregation
+
+Computes every star-rating count and every yes/no count for the Feedback
+collection in a single MongoDB aggregation, so the chart routes need one
+round trip to the database instead of one per column and answer.
+
+The same counts are also kept incrementally in Redis by the write paths, so
+the chart routes can usually skip MongoDB entirely.
+
+Every write also bumps a data version, which the chart routes turn into HTTP
+validators (ETag / Last-Modified) so unchanged pages are answered with 304.
+
+Set STATS_AGGREGATION=numpy to count in the app instead, from NumPy columns
+loaded in one projected cursor pass (see feedback_columns).
+"""
+
+import os
+import time
+import uuid
+from dataclasses import dataclass
+
+from redis.exceptions import WatchError
+
+# Columns holding 1-5 star ratings
+RATING_COLS = [
+    "overall_exp",
+    "doc_care",
+    "doc_comm",
+    "nurse_care",
+    "food_quality",
+    "accommodation",
+    "sanitization",
+    "safety",
+    "staff_support",
+]
+
+# Columns holding "yes"/"no" answers
+YES_NO_COLS = ["doc_involvement", "nurse_promptness", "cleanliness", "timely_info", "med_info"]
+
+STAR_RATINGS = [1, 2, 3, 4, 5]
+
+# "pipeline" counts with a MongoDB $group stage, "numpy" with np.bincount over loaded columns
+STATS_AGGREGATION = os.getenv("STATS_AGGREGATION", "pipeline").lower()
+YES_NO_ANSWERS = ["yes", "no"]
+
+
+@dataclass
+class FeedbackStats:
+    """
+    Star-rating and yes/no counts for the whole Feedback collection.
+
+    Attributes:
+        ratings (dict): Rating column -> counts of 1..5 star ratings.
+        yes_no (dict): Yes/no column -> (yes_count, no_count).
+    """
+
+    ratings: dict[str, list[int]]
+    yes_no: dict[str, tuple[int, int]]
+
+    def rating_total(self, col_name) -> int:
+        """Return the number of star ratings recorded for a column."""
+        return sum(self.ratings[col_name])
+
+    def yes_no_total(self, col_name) -> int:
+        """Return the number of yes/no answers recorded for a column."""
+        return sum(self.yes_no[col_name])
+
+    def star_counts(self, star) -> list[int]:
+        """Return the count of `star`-star ratings for every rating column, in RATING_COLS order."""
+        return [self.ratings[col][star - 1] for col in RATING_COLS]
+
+    def answer_counts(self, answer) -> list[int]:
+        """Return the count of `answer` ("yes" or "no") for every yes/no column, in YES_NO_COLS order."""
+        index = YES_NO_ANSWERS.index(answer)
+        return [self.yes_no[col][index] for col in YES_NO_COLS]
+
+    def rankings(self) -> list[dict]:
+        """
+        Rank the columns by count for each star rating, then for "yes" and for "no" answers.
+
+        Returns:
+            list: One dict per ranking with "key" (star or answer), "title", "labels" and "counts",
+            the counts in decreasing order.
+        """
+        rankings = []
+        for star in STAR_RATINGS:
+            title = f"Count of {star}-Star Ratings by Column"
+            rankings.append(_ranking(str(star), title, RATING_COLS, self.star_counts(star)))
+        yes_no_labels = [f"{col} (Yes/No)" for col in YES_NO_COLS]
+        for answer in YES_NO_ANSWERS:
+            title = "Count of Yes/No Responses by Column"
+            rankings.append(_ranking(answer, title, yes_no_labels, self.answer_counts(answer)))
+        return rankings
+
+    def to_payload(self) -> dict:
+        """
+        Return every count and ranking as plain JSON-serializable data, for the /api/stats endpoint.
+
+        Returns:
+            dict: {"ratings": {col: [1..5 star counts]}, "yes_no": {col: [yes, no]}, "rankings": [...]}
+        """
+        return {
+            "ratings": {col: list(self.ratings[col]) for col in RATING_COLS},
+            "yes_no": {col: list(self.yes_no[col]) for col in YES_NO_COLS},
+            "rankings": self.rankings(),
+        }
+
+
+def _ranking(key, title, labels, counts) -> dict:
+    """Sort labels and counts by decreasing count (ties keep the later column first)."""
+    order = sorted(range(len(counts)), key=counts.__getitem__)[::-1]
+    return {"key": key, "title": title, "labels": [labels[i] for i in order], "counts": [counts[i] for i in order]}
+
+
+def _field_name(col_name, value) -> str:
+    """Name of the output field holding the count of `value` in `col_name`."""
+    return f"{col_name}__{value}"
+
+
+def build_stats_pipeline(match=None) -> list:
+    """
+    Build an aggregation pipeline that counts every rating and yes/no answer.
+
+    A single $group stage emits one document with a conditional sum per
+    (column, value) pair, so the collection is scanned exactly once. With a
+    filter, a $match stage runs first, so only the documents it selects
+    (found through the date / department indexes) are read.
+
+    Args:
+        match (dict): Optional MongoDB filter, e.g. from `feedback_records.build_feedback_filter`.
+
+    Returns:
+        list: The aggregation pipeline.
+    """
+    group = {"_id": None}
+    for col in RATING_COLS:
+        for star in STAR_RATINGS:
+            group[_field_name(col, star)] = {"$sum": {"$cond": [{"$eq": [f"${col}", star]}, 1, 0]}}
+    for col in YES_NO_COLS:
+        for answer in YES_NO_ANSWERS:
+            group[_field_name(col, answer)] = {"$sum": {"$cond": [{"$eq": [f"${col}", answer]}, 1, 0]}}
+    pipeline = [{"$match": match}] if match else []
+    return pipeline + [{"$group": group}]
+
+
+def stats_from_document(doc) -> FeedbackStats:
+    """
+    Convert the document produced by `build_stats_pipeline` into FeedbackStats.
+
+    Args:
+        doc (dict): The aggregation result, or an empty dict for an empty collection.
+
+    Returns:
+        FeedbackStats: The parsed counts.
+    """
+    ratings = {col: [int(doc.get(_field_name(col, star), 0)) for star in STAR_RATINGS] for col in RATING_COLS}
+    yes_no = {col: tuple(int(doc.get(_field_name(col, answer), 0)) for answer in YES_NO_ANSWERS) for col in YES_NO_COLS}
+    return FeedbackStats(ratings=ratings, yes_no=yes_no)
+
+
+def aggregate_feedback_stats(collection, match=None) -> FeedbackStats:
+    """
+    Count every rating and yes/no answer in one aggregation round trip.
+
+    Args:
+        collection: The MongoDB Feedback collection.
+        match (dict): Optional filter restricting the documents counted.
+
+    Returns:
+        FeedbackStats: The counts for every chart column.
+    """
+    if STATS_AGGREGATION == "numpy":
+        from feedback_columns import load_feedback_columns
+
+        return load_feedback_columns(collection, match).to_stats()
+    docs = list(collection.aggregate(build_stats_pipeline(match)))
+    return stats_from_document(docs[0] if docs else {})
+
+
+async def aggregate_feedback_stats_async(collection, match=None) -> FeedbackStats:
+    """
+    Async variant of `aggregate_feedback_stats` for a Motor collection.
+
+    Args:
+        collection: The Motor (asyncio MongoDB) Feedback collection.
+        match (dict): Optional filter restricting the documents counted.
+
+    Returns:
+        FeedbackStats: The counts for every chart column.
+    """
+    if STATS_AGGREGATION == "numpy":
+        from feedback_columns import load_feedback_columns_async
+
+        return (await load_feedback_columns_async(collection, match)).to_stats()
+    docs = await collection.aggregate(build_stats_pipeline(match)).to_list(length=1)
+    return stats_from_document(docs[0] if docs else {})
+
+
+# ----------------------------
+# Incremental Redis Counters
+# ----------------------------
+# One Redis hash per chart column ("stats:{col}") maps each star or answer to its count.
+# The hashes are seeded from MongoDB once and then kept current by every write path.
+COUNTERS_SEEDED_KEY = "stats:seeded"
+
+# Attempts at seeding the counters while writes keep changing the data under the aggregation
+SEED_ATTEMPTS = 5
+
+# Sorted set of writes between their MongoDB write and their counter update, scored by start time
+WRITES_IN_FLIGHT_KEY = "stats:writes_in_flight"
+
+# Seconds after which an unfinished write (it raised, or its process died) no longer holds off seeding
+WRITE_IN_FLIGHT_TIMEOUT = 60
+
+
+def _queue_write_start(pipe, token) -> None:
+    """Queue the registration of a write in flight, dropping writes that timed out."""
+    now = time.time()
+    pipe.zremrangebyscore(WRITES_IN_FLIGHT_KEY, "-inf", now - WRITE_IN_FLIGHT_TIMEOUT)
+    pipe.zadd(WRITES_IN_FLIGHT_KEY, {token: now})
+
+
+def begin_write(redis_client) -> str:
+    """
+    Register a write in flight before it reaches MongoDB, so the counters are not seeded from an
+    aggregation that may already see the write while its counter update is still to come.
+
+    Args:
+        redis_client: The Redis client.
+
+    Returns:
+        str: The token to pass to `end_write` once the write's counters are updated (or it failed).
+    """
+    token = uuid.uuid4().hex
+    pipe = redis_client.pipeline(transaction=False)
+    _queue_write_start(pipe, token)
+    pipe.execute()
+    return token
+
+
+async def begin_write_async(redis_client) -> str:
+    """Async variant of `begin_write` for an asyncio Redis client."""
+    token = uuid.uuid4().hex
+    pipe = redis_client.pipeline(transaction=False)
+    _queue_write_start(pipe, token)
+    await pipe.execute()
+    return token
+
+
+def end_write(pipe, token):
+    """
+    Remove a write registered by `begin_write`, in the same pipeline as its counter updates.
+
+    Args:
+        pipe: A Redis pipeline, or a client when the write failed and there is nothing to count.
+        token (str): The token returned by `begin_write`.
+
+    Returns:
+        The client's reply (await it for an asyncio client).
+    """
+    return pipe.zrem(WRITES_IN_FLIGHT_KEY, token)
+
+
+def counter_key(col_name) -> str:
+    """Name of the Redis hash holding the counts for a chart column."""
+    return f"stats:{col_name}"
+
+
+def update_counters(pipe, feedback_data, amount=1) -> None:
+    """
+    Queue counter increments for one feedback document on a Redis pipeline.
+
+    Args:
+        pipe: A Redis pipeline; the caller executes it.
+        feedback_data (dict): The feedback document.
+        amount (int): 1 when the document is added, -1 when it is removed.
+    """
+    for col in RATING_COLS:
+        if feedback_data.get(col) in STAR_RATINGS:
+            pipe.hincrby(counter_key(col), str(feedback_data[col]), amount)
+    for col in YES_NO_COLS:
+        if feedback_data.get(col) in YES_NO_ANSWERS:
+            pipe.hincrby(counter_key(col), feedback_data[col], amount)
+
+
+def adjust_counters(pipe, old_data, new_data) -> None:
+    """
+    Queue the counter changes needed when a feedback document is edited.
+
+    Args:
+        pipe: A Redis pipeline; the caller executes it.
+        old_data (dict): The document before the update.
+        new_data (dict): The document after the update.
+    """
+    changed_cols = [col for col in RATING_COLS + YES_NO_COLS if old_data.get(col) != new_data.get(col)]
+    update_counters(pipe, {col: old_data.get(col) for col in changed_cols}, -1)
+    update_counters(pipe, {col: new_data.get(col) for col in changed_cols}, 1)
+
+
+def _hash_to_counts(counts, values) -> list[int]:
+    """Read the counts for `values` from a Redis hash reply, whatever its key encoding."""
+    decoded = {(key.decode() if isinstance(key, bytes) else key): int(count) for key, count in counts.items()}
+    return [decoded.get(str(value), 0) for value in values]
+
+
+def read_counter_stats(redis_client):
+    """
+    Read every chart counter from Redis in a single pipeline round trip.
+
+    Args:
+        redis_client: The Redis client.
+
+    Returns:
+        FeedbackStats | None: The counts, or None if the counters have not been seeded yet.
+    """
+    pipe = redis_client.pipeline(transaction=False)
+    _queue_counter_reads(pipe)
+    return _stats_from_counter_replies(pipe.execute())
+
+
+def _queue_counter_reads(pipe) -> None:
+    """Queue the reads of the seeded marker and every counter hash on a Redis pipeline."""
+    pipe.exists(COUNTERS_SEEDED_KEY)
+    for col in RATING_COLS + YES_NO_COLS:
+        pipe.hgetall(counter_key(col))
+
+
+def _stats_from_counter_replies(replies):
+    """Convert the replies to `_queue_counter_reads` into FeedbackStats, or None if not seeded."""
+    seeded, *hashes = replies
+    if not seeded:
+        return None
+
+    ratings = {col: _hash_to_counts(counts, STAR_RATINGS) for col, counts in zip(RATING_COLS, hashes)}
+    yes_no = {
+        col: tuple(_hash_to_counts(counts, YES_NO_ANSWERS))
+        for col, counts in zip(YES_NO_COLS, hashes[len(RATING_COLS) :])
+    }
+    return FeedbackStats(ratings=ratings, yes_no=yes_no)
+
+
+def seed_counters(redis_client, stats) -> None:
+    """
+    Overwrite the Redis counters with freshly aggregated counts.
+
+    Args:
+        redis_client: The Redis client.
+        stats (FeedbackStats): Counts computed from MongoDB.
+    """
+    pipe = redis_client.pipeline()
+    _queue_counter_seed(pipe, stats)
+    pipe.execute()
+
+
+def _queue_counter_seed(pipe, stats) -> None:
+    """Queue the commands that overwrite every counter hash with `stats` on a Redis pipeline."""
+    for col in RATING_COLS:
+        pipe.delete(counter_key(col))
+        pipe.hset(counter_key(col), mapping={str(star): count for star, count in zip(STAR_RATINGS, stats.ratings[col])})
+    for col in YES_NO_COLS:
+        pipe.delete(counter_key(col))
+        pipe.hset(counter_key(col), mapping=dict(zip(YES_NO_ANSWERS, stats.yes_no[col])))
+    pipe.set(COUNTERS_SEEDED_KEY, 1)
+
+
+# ----------------------------
+# Data Version
+# ----------------------------
+# A Redis hash holding a counter bumped by every data write and the time of the last write.
+DATA_VERSION_KEY = "stats:version"
+
+
+def bump_data_version(pipe) -> None:
+    """
+    Queue an increment of the data version on a Redis pipeline, in the same pipeline as the
+    write's counter updates.
+
+    Args:
+        pipe: A Redis pipeline; the caller executes it.
+    """
+    pipe.hincrby(DATA_VERSION_KEY, "version", 1)
+    pipe.hset(DATA_VERSION_KEY, "modified", int(time.time()))
+
+
+def _queue_data_version_read(pipe) -> None:
+    """Queue the read of the data version, recording a modification time first if none exists yet."""
+    pipe.hsetnx(DATA_VERSION_KEY, "modified", int(time.time()))
+    pipe.hmget(DATA_VERSION_KEY, "version", "modified")
+
+
+def _data_version_from_replies(replies) -> tuple[int, int]:
+    """Convert the replies of `_queue_data_version_read` into (version, modified)."""
+    version, modified = replies[-1]
+    return int(version or 0), int(modified)
+
+
+def read_data_version(redis_client) -> tuple[int, int]:
+    """
+    Read the current data version in one round trip.
+
+    Args:
+        redis_client: The Redis client.
+
+    Returns:
+        tuple: (version, modified) where `modified` is the Unix time of the last write.
+    """
+    pipe = redis_client.pipeline(transaction=False)
+    _queue_data_version_read(pipe)
+    return _data_version_from_replies(pipe.execute())
+
+
+async def read_data_version_async(redis_client) -> tuple[int, int]:
+    """Async variant of `read_data_version` for an asyncio Redis client."""
+    pipe = redis_client.pipeline(transaction=False)
+    _queue_data_version_read(pipe)
+    return _data_version_from_replies(await pipe.execute())
+
+
+def load_feedback_stats(collection, redis_client) -> FeedbackStats:
+    """
+    Return the chart counts, preferring the incremental Redis counters.
+
+    Falls back to a MongoDB aggregation (and seeds the counters from it) the
+    first time the counters are read.
+
+    Args:
+        collection: The MongoDB Feedback collection.
+        redis_client: The Redis client.
+
+    Returns:
+        FeedbackStats: The counts for every chart column.
+    """
+    stats = read_counter_stats(redis_client)
+    if stats is None:
+        stats = seed_counters_from(collection, redis_client)
+    return stats
+
+
+def seed_counters_from(collection, redis_client) -> FeedbackStats:
+    """
+    Aggregate the counts from MongoDB and seed the Redis counters with them, unless a concurrent
+    reader seeded them first.
+
+    Every write bumps the data version in the same MULTI as its counter increments, so the seed is
+    only applied if neither the data version nor the seeded marker changed (WATCH) between the
+    aggregation and the overwrite; otherwise the increment would be lost, and the seed is retried.
+    A write the aggregation can see but whose counters are not updated yet would be counted twice,
+    so while any write is in flight (see `begin_write`) the counts are served without seeding.
+
+    Args:
+        collection: The MongoDB Feedback collection.
+        redis_client: The Redis client.
+
+    Returns:
+        FeedbackStats: The counts for every chart column.
+    """
+    for _ in range(SEED_ATTEMPTS):
+        with redis_client.pipeline() as pipe:
+            try:
+                pipe.watch(DATA_VERSION_KEY, COUNTERS_SEEDED_KEY, WRITES_IN_FLIGHT_KEY)
+                if pipe.exists(COUNTERS_SEEDED_KEY):
+                    pipe.unwatch()
+                    stats = read_counter_stats(redis_client)
+                    if stats is not None:
+                        return stats
+                    continue
+                if pipe.zcount(WRITES_IN_FLIGHT_KEY, time.time() - WRITE_IN_FLIGHT_TIMEOUT, "+inf"):
+                    pipe.unwatch()
+                    break
+                stats = aggregate_feedback_stats(collection)
+                pipe.multi()
+                _queue_counter_seed(pipe, stats)
+                pipe.execute()
+                return stats
+            except WatchError:
+                continue
+    # Writes in flight or racing the aggregation: serve its counts and leave seeding to a later read
+    return aggregate_feedback_stats(collection)
+
+
+async def load_feedback_stats_async(collection, redis_client) -> FeedbackStats:
+    """
+    Async variant of `load_feedback_stats` for a Motor collection and an asyncio Redis client.
+
+    Args:
+        collection: The Motor (asyncio MongoDB) Feedback collection.
+        redis_client: The asyncio Redis client.
+
+    Returns:
+        FeedbackStats: The counts for every chart column.
+    """
+    stats = await _read_counter_stats_async(redis_client)
+    if stats is None:
+        stats = await seed_counters_from_async(collection, redis_client)
+    return stats
+
+
+async def _read_counter_stats_async(redis_client):
+    """Async variant of `read_counter_stats` for an asyncio Redis client."""
+    pipe = redis_client.pipeline(transaction=False)
+    _queue_counter_reads(pipe)
+    return _stats_from_counter_replies(await pipe.execute())
+
+
+async def seed_counters_from_async(collection, redis_client) -> FeedbackStats:
+    """Async variant of `seed_counters_from` for a Motor collection and an asyncio Redis client."""
+    for _ in range(SEED_ATTEMPTS):
+        async with redis_client.pipeline() as pipe:
+            try:
+                await pipe.watch(DATA_VERSION_KEY, COUNTERS_SEEDED_KEY, WRITES_IN_FLIGHT_KEY)
+                if await pipe.exists(COUNTERS_SEEDED_KEY):
+                    await pipe.unwatch()
+                    stats = await _read_counter_stats_async(redis_client)
+                    if stats is not None:
+                        return stats
+                    continue
+                if await pipe.zcount(WRITES_IN_FLIGHT_KEY, time.time() - WRITE_IN_FLIGHT_TIMEOUT, "+inf"):
+                    await pipe.unwatch()
+                    break
+                stats = await aggregate_feedback_stats_async(collection)
+                pipe.multi()
+                _queue_counter_seed(pipe, stats)
+                await pipe.execute()
+                return stats
+            except WatchError:
+                continue
+    return await aggregate_feedback_stats_async(collection)
@@ -0,0 +1,130 @@
+/*
+ * Dashboard mode for the analysis pages (?mode=dashboard).
+ *
+ * Fetches the counts from /api/stats once and draws the page's charts in the
+ * browser with Chart.js, so the server sends a few KB of JSON instead of
+ * rendering an image per chart.
+ */
+(function () {
+  "use strict";
+
+  var STAR_LABELS = ["1 Star", "2 Star", "3 Star", "4 Star", "5 Star"];
+
+  function sum(values) {
+    return values.reduce(function (total, value) {
+      return total + value;
+    }, 0);
+  }
+
+  // Append a canvas to the dashboard and draw one chart on it
+  function addChart(container, config) {
+    var wrapper = document.createElement("div");
+    var canvas = document.createElement("canvas");
+    wrapper.className = "dashboard-chart";
+    wrapper.appendChild(canvas);
+    container.appendChild(wrapper);
+    config.options = Object.assign({ maintainAspectRatio: false, animation: false }, config.options);
+    return new Chart(canvas, config);
+  }
+
+  function barChart(title, labels, datasets, xTitle, yTitle, stacked) {
+    return {
+      type: "bar",
+      data: { labels: labels, datasets: datasets },
+      options: {
+        plugins: { title: { display: true, text: title }, legend: { display: datasets.length > 1 } },
+        scales: {
+          x: { stacked: !!stacked, title: { display: true, text: xTitle } },
+          y: { stacked: !!stacked, beginAtZero: true, title: { display: true, text: yTitle } },
+        },
+      },
+    };
+  }
+
+  function pieChart(title, labels, counts, legendTitle) {
+    var total = sum(counts);
+    var legendLabels = labels.map(function (label, i) {
+      return label + " " + counts[i] + (total > 0 ? " (" + ((counts[i] / total) * 100).toFixed(1) + "%)" : "");
+    });
+    return {
+      type: "pie",
+      data: { labels: legendLabels, datasets: [{ data: counts }] },
+      options: {
+        plugins: {
+          title: { display: true, text: title },
+          legend: { position: "right", title: { display: !!legendTitle, text: legendTitle } },
+        },
+      },
+    };
+  }
+
+  // One function per page: draw its charts and return the text appended to the page heading
+  var pages = {
+    bargraphs: function (container, stats) {
+      var totalRatings = 0;
+      Object.keys(stats.ratings).forEach(function (col) {
+        var counts = stats.ratings[col];
+        totalRatings += sum(counts);
+        addChart(container, barChart(col, STAR_LABELS, [{ label: col, data: counts }], "Rating", "Number of Patients"));
+      });
+
+      var questions = Object.keys(stats.yes_no);
+      var datasets = ["Yes", "No"].map(function (answer, i) {
+        return {
+          label: answer,
+          data: questions.map(function (question) {
+            return stats.yes_no[question][i];
+          }),
+        };
+      });
+      addChart(container, barChart("Responses to Yes/No Questions", questions, datasets, "Question", "Count", true));
+      return "Total Ratings = " + totalRatings;
+    },
+
+    piecharts: function (container, stats) {
+      var cols = Object.keys(stats.ratings);
+      var totalRatings = 0;
+      cols.forEach(function (col) {
+        totalRatings += sum(stats.ratings[col]);
+        addChart(container, pieChart(col + " Rating", STAR_LABELS, stats.ratings[col], "Star Ratings"));
+      });
+      Object.keys(stats.yes_no).forEach(function (question) {
+        addChart(container, pieChart(question, ["Yes", "No"], stats.yes_no[question]));
+      });
+      return "Average Total Ratings = " + Math.floor(totalRatings / cols.length);
+    },
+
+    overall_bargraphs: function (container, stats) {
+      stats.rankings.forEach(function (ranking) {
+        var datasets = [{ label: "Count", data: ranking.counts }];
+        addChart(container, barChart(ranking.title, ranking.labels, datasets, "Column", "Count"));
+      });
+      return "";
+    },
+  };
+
+  document.addEventListener("DOMContentLoaded", function () {
+    var container = document.getElementById("dashboard");
+    var heading = document.querySelector("h1");
+    // Pass the page's filters (from, to, department) on to the statistics
+    var params = new URLSearchParams(window.location.search);
+    params.delete("mode");
+    var query = params.toString();
+    fetch(container.dataset.statsUrl + (query ? "?" + query : ""))
+      .then(function (response) {
+        if (!response.ok) {
+          throw new Error(response.status + " " + response.statusText);
+        }
+        return response.json();
+      })
+      .then(function (stats) {
+        var summary = pages[container.dataset.page](container, stats);
+        if (summary && heading) {
+          heading.textContent += " (" + summary + ")";
+        }
+      })
+      .catch(function (error) {
+        container.textContent = "Could not load the statistics: " + error.message;
+      });
+  });
+})();
@@ -0,0 +1,287 @@
+"""
+SVG Chart Rendering
+
+A small SVG generator for the chart shapes the analytics pages use: star
+rating histograms, the stacked yes/no bar graph, rating and yes/no pies, and
+the column rankings. Each chart is built as a string in microseconds, is a
+few KB, and is written straight into the page, so no image is rendered,
+encoded, stored or fetched.
+
+Titles, labels and legends match the matplotlib charts in charts.py, which
+remain the fallback: set CHART_RENDERER=matplotlib to use them everywhere,
+and any chart the SVG renderer cannot draw is drawn by matplotlib instead.
+"""
+
+import math
+import os
+from html import escape
+
+SVG_ENABLED = os.getenv("CHART_RENDERER", "svg").lower() != "matplotlib"
+
+STAR_LABELS = ["1 Star", "2 Star", "3 Star", "4 Star", "5 Star"]
+
+# matplotlib's default color cycle, so both renderers color charts alike
+COLORS = ["#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd", "#8c564b", "#e377c2", "#7f7f7f"]
+
+FONT_SIZE = 14
+TITLE_SIZE = 17
+LINE_HEIGHT = 17
+CHAR_WIDTH = 8  # Approximate width of one character at FONT_SIZE, for sizing legends
+
+
+def _fmt(value) -> str:
+    """Format a coordinate compactly."""
+    return f"{value:.1f}".rstrip("0").rstrip(".")
+
+
+def _text(x, y, text, anchor="middle", size=FONT_SIZE, rotate=False) -> str:
+    """A <text> element; `rotate` turns it to read bottom-to-top, as vertical tick labels do."""
+    attrs = f'x="{_fmt(x)}" y="{_fmt(y)}" text-anchor="{anchor}" font-size="{size}"'
+    if rotate:
+        attrs += f' transform="rotate(-90 {_fmt(x)} {_fmt(y)})"'
+    return f"<text {attrs}>{escape(str(text))}</text>"
+
+
+def _svg(width, height, title, body) -> str:
+    """Wrap chart elements in a standalone, scalable <svg> element."""
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {width} {height}" width="{width}" height="{height}" '
+        f'style="max-width: 100%; height: auto;" role="img" aria-label="{escape(title)}" '
+        f'font-family="DejaVu Sans, Verdana, sans-serif"><rect width="{width}" height="{height}" fill="white"/>'
+        f"{''.join(body)}</svg>"
+    )
+
+
+def _nice_ticks(max_value) -> list:
+    """Return evenly spaced round tick values from 0 that cover `max_value`."""
+    if max_value <= 0:
+        return [0, 1]
+    raw_step = max_value / 5
+    magnitude = 10 ** math.floor(math.log10(raw_step))
+    step = next(m * magnitude for m in (1, 2, 2.5, 5, 10) if m * magnitude >= raw_step)
+    if step < 1:
+        step = 1  # Counts are whole numbers
+    top = math.ceil(max_value * 1.05 / step) * step
+    return [round(i * step, 6) for i in range(int(round(top / step)) + 1)]
+
+
+def _legend(x, y, entries, title=None) -> list:
+    """
+    Draw a legend box whose top-right corner is at (x, y).
+
+    Args:
+        entries (list): (color, text) pairs; text may span several lines separated by "\\n".
+    """
+    lines = [line for _, text in entries for line in text.split("\n")] + ([title] if title else [])
+    width = max(len(line) for line in lines) * CHAR_WIDTH + 46
+    height = sum(len(text.split("\n")) * LINE_HEIGHT + 6 for _, text in entries) + (LINE_HEIGHT + 4 if title else 0) + 8
+    left = x - width
+    body = [
+        f'<rect x="{_fmt(left)}" y="{_fmt(y)}" width="{_fmt(width)}" height="{_fmt(height)}" '
+        'fill="white" fill-opacity="0.8" stroke="#cccccc" rx="3"/>'
+    ]
+    cursor = y + 6
+    if title:
+        body.append(_text(left + width / 2, cursor + FONT_SIZE, title))
+        cursor += LINE_HEIGHT + 4
+    for color, text in entries:
+        text_lines = text.split("\n")
+        block = len(text_lines) * LINE_HEIGHT
+        swatch_y = cursor + block / 2 - 5
+        body.append(f'<rect x="{_fmt(left + 8)}" y="{_fmt(swatch_y)}" width="22" height="10" fill="{color}"/>')
+        for i, line in enumerate(text_lines):
+            body.append(_text(left + 38, cursor + (i + 1) * LINE_HEIGHT - 4, line, anchor="start"))
+        cursor += block + 6
+    return body
+
+
+def _bar_chart(width, height, margins, title, categories, series, xlabel, ylabel, rotate_labels=False, legend=False):
+    """
+    Draw a (possibly stacked) bar chart with a count label on top of every bar segment.
+
+    Args:
+        margins (tuple): (left, right, top, bottom) space around the plot area, in pixels.
+        categories (list): Tick label per bar.
+        series (list): (name, counts, color) per stacked layer, bottom layer first.
+    """
+    left, right, top, bottom = margins
+    x0, x1, y0, y1 = left, width - right, top, height - bottom
+    totals = [sum(layer[1][i] for layer in series) for i in range(len(categories))]
+    ticks = _nice_ticks(max(totals, default=0))
+    y_max = ticks[-1]
+    slot = (x1 - x0) / max(len(categories), 1)
+
+    def y_of(value):
+        return y1 - (y1 - y0) * value / y_max
+
+    body = [_text(width / 2, y0 - 12, title, size=TITLE_SIZE)]
+    for tick in ticks:
+        y = y_of(tick)
+        body.append(f'<line x1="{_fmt(x0 - 5)}" y1="{_fmt(y)}" x2="{_fmt(x0)}" y2="{_fmt(y)}" stroke="black"/>')
+        body.append(_text(x0 - 8, y + 5, f"{tick:g}", anchor="end"))
+
+    bases = [0] * len(categories)
+    for _, counts, color in series:
+        for i, count in enumerate(counts):
+            bar_top = y_of(bases[i] + count)
+            bar_x = x0 + slot * (i + 0.1)
+            body.append(
+                f'<rect x="{_fmt(bar_x)}" y="{_fmt(bar_top)}" width="{_fmt(slot * 0.8)}" '
+                f'height="{_fmt(y_of(bases[i]) - bar_top)}" fill="{color}"/>'
+            )
+            body.append(_text(x0 + slot * (i + 0.5), bar_top - 4, count))
+            bases[i] += count
+
+    for i, category in enumerate(categories):
+        x = x0 + slot * (i + 0.5)
+        body.append(f'<line x1="{_fmt(x)}" y1="{_fmt(y1)}" x2="{_fmt(x)}" y2="{_fmt(y1 + 5)}" stroke="black"/>')
+        if rotate_labels:
+            body.append(_text(x + 5, y1 + 10, category, anchor="end", rotate=True))
+        else:
+            body.append(_text(x, y1 + 22, category))
+
+    body.append(
+        f'<rect x="{_fmt(x0)}" y="{_fmt(y0)}" width="{_fmt(x1 - x0)}" height="{_fmt(y1 - y0)}" '
+        'fill="none" stroke="black"/>'
+    )
+    body.append(_text((x0 + x1) / 2, height - 12, xlabel))
+    body.append(_text(18, (y0 + y1) / 2, ylabel, rotate=True))
+    if legend:
+        body += _legend(x1 - 8, y0 + 8, [(color, name) for name, _, color in reversed(series)])
+    return _svg(width, height, title, body)
+
+
+def _pie_chart(title, labels, values, legend_title=None) -> str:
+    """Draw a pie starting at 12 o'clock and running counter-clockwise, with a legend on the right."""
+    width, height = 640, 480
+    cx, cy, radius = 300, 250, 165
+    total = sum(values)
+    body = [_text(cx, 40, title, size=TITLE_SIZE)]
+
+    angle = 90.0
+    for value, color in zip(values, COLORS):
+        if total <= 0 or value <= 0:
+            continue
+        sweep = 360.0 * value / total
+        if sweep >= 359.999:
+            body.append(f'<circle cx="{cx}" cy="{cy}" r="{radius}" fill="{color}"/>')
+            break
+        start, end = math.radians(angle), math.radians(angle + sweep)
+        x1, y1 = cx + radius * math.cos(start), cy - radius * math.sin(start)
+        x2, y2 = cx + radius * math.cos(end), cy - radius * math.sin(end)
+        large_arc = 1 if sweep > 180 else 0
+        body.append(
+            f'<path d="M{cx},{cy} L{_fmt(x1)},{_fmt(y1)} A{radius},{radius} 0 {large_arc} 0 {_fmt(x2)},{_fmt(y2)} Z" '
+            f'fill="{color}"/>'
+        )
+        angle += sweep
+    if total <= 0:
+        body.append(f'<circle cx="{cx}" cy="{cy}" r="{radius}" fill="none" stroke="#cccccc"/>')
+
+    body += _legend(width - 10, 60, list(zip(COLORS, labels)), legend_title)
+    return _svg(width, height, title, body)
+
+
+def bar_graph_rating(col_name, counts) -> str:
+    """SVG version of `charts.bar_graph_rating`: star rating counts for one rating column."""
+    return _bar_chart(
+        640,
+        480,
+        (80, 64, 58, 58),
+        col_name,
+        STAR_LABELS,
+        [(col_name, list(counts), COLORS[0])],
+        "Rating",
+        "Number of Patients",
+    )
+
+
+def bar_graph_yes_no(questions, counts_yes, counts_no) -> str:
+    """SVG version of `charts.bar_graph_yes_no`: stacked yes/no answers for every question."""
+    return _bar_chart(
+        1500,
+        800,
+        (90, 30, 60, 70),
+        "Responses to Yes/No Questions",
+        list(questions),
+        [("Yes", list(counts_yes), COLORS[0]), ("No", list(counts_no), COLORS[1])],
+        "Question",
+        "Count",
+        legend=True,
+    )
+
+
+def piechart_rating(col_name, sizes) -> str:
+    """SVG version of `charts.piechart_rating`: share of each star rating for one rating column."""
+    total = sum(sizes)
+    percentages = [f"{size} ({size / total * 100:.1f}%)" if total > 0 else "0" for size in sizes]
+    legend_labels = [f"{label}\n{perc}" for label, perc in zip(STAR_LABELS, percentages)]
+    return _pie_chart(f"{col_name} Rating", legend_labels, list(sizes), legend_title="Star Ratings")
+
+
+def plot_pie(question, yes_count, no_count) -> str:
+    """SVG version of `charts.plot_pie`: share of yes and no answers for one question."""
+    total_count = yes_count + no_count if (yes_count + no_count) > 0 else 1
+    values = [yes_count, no_count]
+    percentages = [f"{count} ({count / total_count * 100:.1f}%)" for count in values]
+    legend_labels = [f"{label}\n{perc}" for label, perc in zip(["Yes", "No"], percentages)]
+    return _pie_chart(question, legend_labels, values)
+
+
+def ranking_bar_graph(title, labels, counts) -> str:
+    """SVG version of `charts.ranking_bar_graph`: columns ranked by count."""
+    label_space = max((len(label) for label in labels), default=0) * CHAR_WIDTH + 40
+    return _bar_chart(
+        1000,
+        600 + label_space,
+        (70, 20, 40, label_space + 30),
+        title,
+        list(labels),
+        [(title, [int(count) for count in counts], COLORS[0])],
+        "Column",
+        "Count",
+        rotate_labels=True,
+    )
+
+
+# Chart kind (a charts.py function name) -> its SVG version
+SVG_CHARTS = {
+    "bar_graph_rating": bar_graph_rating,
+    "bar_graph_yes_no": bar_graph_yes_no,
+    "piechart_rating": piechart_rating,
+    "plot_pie": plot_pie,
+    "ranking_bar_graph": ranking_bar_graph,
+}
+
+
+def render_svg(spec) -> str:
+    """
+    Draw a chart spec (see chart_executor.ChartSpec) as SVG markup.
+
+    Raises:
+        ValueError: If there is no SVG version of `spec.kind`.
+    """
+    render = SVG_CHARTS.get(spec.kind)
+    if render is None:
+        raise ValueError(f"No SVG version of chart {spec.kind!r}")
+    return render(*spec.data)
+
+
+def render_many(specs) -> list:
+    """
+    Draw a batch of chart specs as inline SVG.
+
+    Returns:
+        list: SVG markup per spec, or None where matplotlib has to draw the chart instead
+        (CHART_RENDERER=matplotlib, a chart kind without an SVG version, or a failed render).
+    """
+    if not SVG_ENABLED:
+        return [None] * len(specs)
+    rendered = []
+    for spec in specs:
+        try:
+            rendered.append(render_svg(spec))
+        except Exception as e:
+            print(f"SVG rendering of {spec.kind} failed, falling back to matplotlib: {e}")
+            rendered.append(None)
+    return rendered
@@ -0,0 +1,244 @@
+"""
+Write-Behind Feedback Queue
+
+With FEEDBACK_WRITE_BEHIND=1 the feedback routes no longer wait on MongoDB:
+they append the record to a Redis Stream and redirect straight away. This
+module's worker drains the stream through a consumer group into MongoDB with
+batched insert_many calls, updates the chart counters for what it stored, and
+retries failed records until they move to a dead-letter list.
+
+Run the worker as its own process:
+
+    python write_behind.py
+"""
+
+import json
+import os
+import socket
+import threading
+
+import redis
+from pymongo.errors import BulkWriteError
+
+from feedback_records import to_document
+from feedback_stats import begin_write, bump_data_version, end_write, update_counters
+
+# Set FEEDBACK_WRITE_BEHIND=1 to queue submissions instead of inserting them inline
+WRITE_BEHIND_ENABLED = os.getenv("FEEDBACK_WRITE_BEHIND", "0").lower() in ("1", "true", "yes")
+
+STREAM_KEY = "feedback:stream"
+GROUP_NAME = "feedback-writers"
+DEAD_LETTER_KEY = "feedback:dead_letter"
+
+# MongoDB error code for a unique index violation
+DUPLICATE_KEY_ERROR = 11000
+
+
+def enqueue_feedback(redis_client, feedback_data):
+    """
+    Append a feedback record to the write-behind stream.
+
+    Works with both the blocking and the asyncio Redis client (await the result for the latter).
+
+    Args:
+        redis_client: The Redis client.
+        feedback_data (dict): The validated feedback document.
+
+    Returns:
+        The stream entry ID (or an awaitable of it).
+    """
+    return redis_client.xadd(STREAM_KEY, {"data": json.dumps(feedback_data)})
+
+
+class WriteBehindWorker:
+    """
+    Consumer-group worker that moves queued feedback from the Redis Stream into MongoDB.
+
+    Args:
+        collection: The MongoDB Feedback collection.
+        redis_client: The Redis client.
+        consumer_name (str): Name of this consumer within the group (defaults to host and PID).
+        batch_size (int): Maximum number of records read and inserted per round trip.
+        block_ms (int): How long to wait for new records before checking for retries.
+        retry_idle_ms (int): How long a failed record stays pending before it is retried.
+        max_deliveries (int): Attempts before a record is moved to the dead-letter list.
+    """
+
+    def __init__(
+        self,
+        collection,
+        redis_client,
+        consumer_name=None,
+        batch_size=500,
+        block_ms=5000,
+        retry_idle_ms=30000,
+        max_deliveries=5,
+    ):
+        self.collection = collection
+        self.redis_client = redis_client
+        self.consumer_name = consumer_name or f"{socket.gethostname()}-{os.getpid()}"
+        self.batch_size = batch_size
+        self.block_ms = block_ms
+        self.retry_idle_ms = retry_idle_ms
+        self.max_deliveries = max_deliveries
+
+    def ensure_group(self) -> None:
+        """Create the stream and consumer group if they do not exist yet."""
+        try:
+            self.redis_client.xgroup_create(STREAM_KEY, GROUP_NAME, id="0", mkstream=True)
+        except redis.exceptions.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def run_once(self) -> int:
+        """
+        Retry stale pending records, then read and store one batch of new records.
+
+        Returns:
+            int: Number of records processed (stored, dead-lettered or left for retry).
+        """
+        processed = self._retry_pending()
+        response = self.redis_client.xreadgroup(
+            GROUP_NAME, self.consumer_name, {STREAM_KEY: ">"}, count=self.batch_size, block=self.block_ms
+        )
+        for _, messages in response or []:
+            self._store(messages)
+            processed += len(messages)
+        return processed
+
+    def run_forever(self, stop_event=None) -> None:
+        """
+        Drain the stream until `stop_event` (a threading.Event) is set.
+
+        Args:
+            stop_event: Optional event used to stop the loop.
+        """
+        stop_event = stop_event or threading.Event()
+        has_group = False
+        while not stop_event.is_set():
+            try:
+                if not has_group:
+                    self.ensure_group()
+                    has_group = True
+                self.run_once()
+            except redis.exceptions.ResponseError as e:
+                if "NOGROUP" in str(e):
+                    # The stream or its consumer group was deleted: recreate them on the next pass
+                    print(f"Write-behind consumer group missing, recreating it: {e}")
+                    has_group = False
+                    continue
+                print(f"Write-behind worker Redis error: {e}")
+                stop_event.wait(1)
+            except redis.exceptions.RedisError as e:
+                # Connection lost, or a socket timeout shorter than block_ms: back off and retry
+                print(f"Write-behind worker lost its Redis connection: {e}")
+                stop_event.wait(1)
+
+    def _retry_pending(self) -> int:
+        """Claim records that failed earlier and retry them, dead-lettering those out of attempts."""
+        pending = self.redis_client.xpending_range(
+            STREAM_KEY, GROUP_NAME, min="-", max="+", count=self.batch_size, idle=self.retry_idle_ms
+        )
+        if not pending:
+            return 0
+
+        exhausted = [entry["message_id"] for entry in pending if entry["times_delivered"] >= self.max_deliveries]
+        retry = [entry["message_id"] for entry in pending if entry["times_delivered"] < self.max_deliveries]
+        for message_id in exhausted:
+            for _, fields in self.redis_client.xrange(STREAM_KEY, message_id, message_id):
+                self._dead_letter(message_id, fields, "Exceeded maximum delivery attempts")
+        if retry:
+            messages = self.redis_client.xclaim(
+                STREAM_KEY, GROUP_NAME, self.consumer_name, min_idle_time=self.retry_idle_ms, message_ids=retry
+            )
+            self._store(messages)
+        return len(pending)
+
+    def _store(self, messages) -> None:
+        """Insert a batch of stream entries into MongoDB and acknowledge the ones that are done."""
+        message_ids = []
+        records = []
+        for message_id, fields in messages:
+            try:
+                records.append(json.loads(fields[b"data"]))
+                message_ids.append(message_id)
+            except (KeyError, ValueError) as e:
+                self._dead_letter(message_id, fields, f"Unreadable record: {e}")
+        if not records:
+            return
+
+        write_errors = {}
+        write_token = begin_write(self.redis_client)
+        try:
+            # Insert copies so MongoDB's generated _id is not added to the queued records
+            self.collection.insert_many([to_document(record) for record in records], ordered=False)
+        except BulkWriteError as e:
+            write_errors = {error["index"]: error for error in e.details["writeErrors"]}
+        except Exception as e:
+            # MongoDB unavailable: leave the whole batch pending so it is retried later
+            print(f"Write-behind insert failed, will retry: {e}")
+            end_write(self.redis_client, write_token)
+            return
+
+        pipe = self.redis_client.pipeline()
+        for index, (message_id, record) in enumerate(zip(message_ids, records)):
+            error = write_errors.get(index)
+            if error is None:
+                update_counters(pipe, record)
+            elif error.get("code") == DUPLICATE_KEY_ERROR:
+                # The patient_id is already stored, and its data key belongs to that document
+                reason = error.get("errmsg", "Duplicate patient_id")
+                self._queue_dead_letter(pipe, message_id, record, reason, release=False)
+            else:
+                continue  # Leave pending for a later retry
+            pipe.xack(STREAM_KEY, GROUP_NAME, message_id)
+            pipe.xdel(STREAM_KEY, message_id)
+        if len(write_errors) < len(records):
+            bump_data_version(pipe)
+        end_write(pipe, write_token)
+        pipe.execute()
+
+    def _dead_letter(self, message_id, fields, reason) -> None:
+        """Move an entry that cannot be stored to the dead-letter list and acknowledge it."""
+        data = fields.get(b"data", b"").decode("utf-8", errors="replace")
+        pipe = self.redis_client.pipeline()
+        self._queue_dead_letter(pipe, message_id, data, reason)
+        pipe.xack(STREAM_KEY, GROUP_NAME, message_id)
+        pipe.xdel(STREAM_KEY, message_id)
+        pipe.execute()
+
+    @staticmethod
+    def _queue_dead_letter(pipe, message_id, record, reason, release=True) -> None:
+        """
+        Queue an LPUSH of a failed record, with the reason it failed, onto the dead-letter list.
+
+        With `release`, the record's `data:{patient_id}` key is deleted too: the feedback routes
+        claimed it as their duplicate check, so keeping it for a record that was never stored would
+        block the patient from ever submitting again.
+        """
+        if isinstance(message_id, bytes):
+            message_id = message_id.decode()
+        pipe.lpush(DEAD_LETTER_KEY, json.dumps({"id": message_id, "record": record, "error": reason}))
+        patient_id = _patient_id_of(record) if release else None
+        if patient_id is not None:
+            pipe.delete(f"data:{patient_id}")
+
+
+def _patient_id_of(record):
+    """Return the patient_id of a queued record (a dict or its JSON text), or None if it has none."""
+    if isinstance(record, str):
+        try:
+            record = json.loads(record)
+        except ValueError:
+            return None
+    return record.get("patient_id") if isinstance(record, dict) else None
+
+
+if __name__ == "__main__":
+    from db_clients import get_feedback_collection, get_mongo_client, get_redis_client
+
+    get_mongo_client(ping=True)
+    # get_feedback_collection creates the unique patient_id index the DuplicateKeyError handling relies on
+    worker = WriteBehindWorker(get_feedback_collection(), get_redis_client(ping=True))
+    print(f"Write-behind worker {worker.consumer_name} draining {STREAM_KEY}")
+    worker.run_forever()